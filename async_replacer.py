@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+PDF文本替换 asyncio 接口
+在线程池或进程池中执行阻塞的替换过程，以异步迭代的方式产出逐页进度事件，
+支持在页与页之间协作式取消，并用信号量限制同时处理的文档数。
+"""
+
+import os
+import queue
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Dict
+
+from pdf_replacer_pymupdf import FontRegistry, PyMuPDFTextReplacer, RuleSet
+
+# 进程池模式下每个工作进程持有的规则集和字体注册表，由 _init_async_worker 创建
+_worker_ruleset: RuleSet | None = None
+_worker_font_registry: FontRegistry | None = None
+
+# 轮询进度队列的间隔（秒）
+_POLL_INTERVAL = 0.05
+
+
+def _init_async_worker(ruleset: RuleSet, fonts_dir: str):
+    """工作进程初始化：接收已编译的规则集，扫描一次字体目录"""
+    global _worker_ruleset, _worker_font_registry
+    _worker_ruleset = ruleset
+    _worker_font_registry = FontRegistry(fonts_dir)
+
+
+def _run_job(input_pdf: str, output_pdf: str, method: str, save_profile: str, events, cancel_event,
+             ruleset: RuleSet | None = None, font_registry: FontRegistry | None = None) -> int:
+    """在线程或工作进程中执行一个文档的替换，进度事件写入 events 队列"""
+    # 替换器在一次运行期间保存进度和取消状态，每个任务使用独立的实例
+    replacer = PyMuPDFTextReplacer(ruleset or _worker_ruleset, font_registry=font_registry or _worker_font_registry)
+    return replacer.replace_pdf(input_pdf, output_pdf, method=method, save_profile=save_profile,
+                                progress_callback=events.put, cancel_event=cancel_event)
+
+
+class AsyncReplacer:
+    """
+    PyMuPDFTextReplacer 的 asyncio 封装
+
+    规则只编译一次。默认使用进程池，多个文档可真正并行处理；processes=False 时在当前进程的
+    线程中处理，日志和字体注册表与调用方共享（适合 GUI），但 PyMuPDF 不保证多线程安全，
+    此时同时处理的文档数默认为 1。
+    """
+
+    def __init__(self, rules_source: str | Dict[str, str] | RuleSet, fonts_dir: str = "fonts",
+                 processes: bool = True, max_concurrent: int = 0):
+        """
+        Args:
+            rules_source: 替换规则，文件路径、规则字典或已编译的规则集
+            fonts_dir: 本地字体目录
+            processes: True 使用进程池，False 使用线程
+            max_concurrent: 同时处理的文档数上限，0 表示进程模式取 CPU 核数、线程模式取 1
+        """
+        replacer = PyMuPDFTextReplacer(rules_source, fonts_dir=fonts_dir)
+        self.ruleset = replacer.ruleset
+        self.fonts_dir = replacer.fonts_dir
+        self.font_registry = replacer.font_registry
+        self.processes = processes
+        self.max_concurrent = max_concurrent or ((os.cpu_count() or 1) if processes else 1)
+        self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        self._executor: Executor | None = None
+        self._manager = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.processes:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_concurrent, initializer=_init_async_worker,
+                                                     initargs=(self.ruleset, self.fonts_dir))
+                # 进度队列和取消事件需要跨进程共享
+                self._manager = multiprocessing.Manager()
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent)
+        return self._executor
+
+    async def iter_replace(self, input_pdf: str, output_pdf: str, method: str = 'precise',
+                           save_profile: str = 'compact') -> AsyncIterator[dict]:
+        """
+        替换一个文档，逐页产出进度事件
+
+        进度事件为 {"page", "pages", "replacements"}，最后产出
+        {"done": True, "replacements": 总替换次数}。取消正在迭代的任务时，工作线程或进程
+        在下一页开始前停止，不会写出输出文件，CancelledError 照常向上传播。
+        """
+        async with self._semaphore:
+            executor = self._get_executor()
+            if self.processes:
+                events, cancel_event = self._manager.Queue(), self._manager.Event()
+                job_args = ()
+            else:
+                events, cancel_event = queue.Queue(), threading.Event()
+                job_args = (self.ruleset, self.font_registry)
+
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(executor, _run_job, input_pdf, output_pdf, method, save_profile,
+                                          events, cancel_event, *job_args)
+            try:
+                while True:
+                    try:
+                        yield events.get_nowait()
+                        continue
+                    except queue.Empty:
+                        pass
+                    if future.done():
+                        break
+                    await asyncio.wait({future}, timeout=_POLL_INTERVAL)
+                # 任务结束后再取一次，保证最后几页的进度不丢失
+                while True:
+                    try:
+                        yield events.get_nowait()
+                    except queue.Empty:
+                        break
+                yield {"done": True, "replacements": future.result()}
+            finally:
+                if not future.done():
+                    cancel_event.set()
+                    # 等待工作端在页边界停下，释放信号量前不让新的任务抢占执行槽
+                    try:
+                        await asyncio.shield(future)
+                    except (Exception, asyncio.CancelledError):
+                        pass
+
+    async def replace_pdf(self, input_pdf: str, output_pdf: str, method: str = 'precise',
+                          save_profile: str = 'compact', progress: Callable[[dict], None] | None = None) -> int:
+        """
+        替换一个文档并返回替换次数
+
+        Args:
+            progress: 可选，在事件循环中以每页进度事件调用
+        """
+        replacements = 0
+        async for event in self.iter_replace(input_pdf, output_pdf, method=method, save_profile=save_profile):
+            if event.get("done"):
+                replacements = event["replacements"]
+            elif progress:
+                progress(event)
+        return replacements
+
+    async def close(self):
+        """关闭进程池或线程池"""
+        if self._executor is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+            self._executor = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+
+    async def __aenter__(self) -> "AsyncReplacer":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
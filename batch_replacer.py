@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+PDF批量文本替换脚本
+规则只编译一次，多个PDF文件分发到有界进程池中并行处理，每个文件的结果写入JSONL报告。
+"""
+
+import sys
+import os
+import glob
+import json
+import time
+import shutil
+import argparse
+import logging
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Iterator, List, Tuple
+
+from corpus_index import CorpusIndex
+from pdf_replacer_pymupdf import (PyMuPDFTextReplacer, ResultCache, RuleSet, SAVE_PROFILES, RESULTS_CACHE_DIR,
+                                  RESULTS_CACHE_MAX_MB)
+
+logger = logging.getLogger(__name__)
+
+
+def collect_jobs(source: str, output_dir: str, suffix: str = "_replaced") -> List[Tuple[str, str]]:
+    """
+    根据输入来源生成 (输入PDF, 输出PDF) 任务列表
+
+    Args:
+        source: 目录（递归查找其中的PDF）、glob 通配符，或清单文件
+                （每行一个输入路径，也可写成 "输入路径|输出路径"，# 开头为注释）
+        output_dir: 输出目录，未在清单中指定输出路径时使用
+        suffix: 自动生成输出文件名时追加的后缀
+
+    Returns:
+        任务列表，输出文件保持输入文件之间的相对目录结构
+    """
+    explicit: Dict[str, str] = {}
+    if os.path.isdir(source):
+        inputs = sorted(glob.glob(os.path.join(source, "**", "*.pdf"), recursive=True))
+    elif os.path.isfile(source) and not source.lower().endswith(".pdf"):
+        inputs = []
+        with open(source, 'r', encoding='utf-8') as f:
+            for line_num, line in enumerate(f, 1):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                parts = [part.strip() for part in line.split('|')]
+                if len(parts) > 2:
+                    logger.warning(f"清单第 {line_num} 行格式错误，跳过: {line}")
+                    continue
+                inputs.append(parts[0])
+                if len(parts) == 2:
+                    explicit[parts[0]] = parts[1]
+    else:
+        inputs = sorted(glob.glob(source, recursive=True))
+
+    if not inputs:
+        return []
+
+    # 以所有输入文件的公共目录为根，保留相对路径，避免同名文件互相覆盖
+    base_dir = os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in inputs])
+    jobs = []
+    for input_pdf in inputs:
+        output_pdf = explicit.get(input_pdf)
+        if output_pdf is None:
+            rel_path = os.path.relpath(os.path.abspath(input_pdf), base_dir)
+            stem, ext = os.path.splitext(rel_path)
+            output_pdf = os.path.join(output_dir, f"{stem}{suffix}{ext}")
+        jobs.append((input_pdf, output_pdf))
+    return jobs
+
+
+# 每个工作进程持有的替换器和结果缓存，由 _init_batch_worker 创建一次后处理该进程的所有文件
+_batch_replacer: PyMuPDFTextReplacer | None = None
+_batch_result_cache: ResultCache | None = None
+
+
+def _init_batch_worker(ruleset: RuleSet, fonts_dir: str, result_cache_dir: str | None = None,
+                       result_cache_mb: float = RESULTS_CACHE_MAX_MB):
+    """工作进程初始化：用已编译好的规则集构建一次替换器"""
+    global _batch_replacer, _batch_result_cache
+    _batch_replacer = PyMuPDFTextReplacer(ruleset, fonts_dir=fonts_dir)
+    if result_cache_dir:
+        _batch_result_cache = ResultCache(result_cache_dir, result_cache_mb)
+
+
+def _replace_one(input_pdf: str, output_pdf: str, method: str, save_profile: str | None,
+                 checkpoint_dir: str | None = None, pages: List[int] | None = None) -> dict:
+    """处理单个文件，任何异常都记录在结果中而不向上抛出，保证单个坏文件不影响整批"""
+    start_time = time.time()
+    result = {"input": input_pdf, "output": output_pdf, "method": method}
+    try:
+        if os.path.abspath(input_pdf) == os.path.abspath(output_pdf):
+            raise ValueError("输出文件不能与输入文件相同")
+        out_dir = os.path.dirname(output_pdf)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        result["replacements"] = _batch_replacer.replace_pdf(input_pdf, output_pdf, method=method,
+                                                             save_profile=save_profile,
+                                                             result_cache=_batch_result_cache,
+                                                             checkpoint_dir=checkpoint_dir, pages=pages)
+        result["size"] = os.path.getsize(output_pdf)
+        if _batch_result_cache is not None:
+            result["cache"] = "hit" if _batch_replacer.metrics.counters.get("result_cache_hits") else "miss"
+        result["status"] = "ok"
+    except Exception as e:
+        result["replacements"] = 0
+        result["status"] = "error"
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["elapsed"] = round(time.time() - start_time, 3)
+    return result
+
+
+def _copy_skipped(input_pdf: str, output_pdf: str, method: str) -> dict:
+    """索引判定不会命中的文件原样复制到输出路径（不用 fitz 打开），结果状态为 skipped"""
+    start_time = time.time()
+    result = {"input": input_pdf, "output": output_pdf, "method": method, "replacements": 0}
+    try:
+        if os.path.abspath(input_pdf) == os.path.abspath(output_pdf):
+            raise ValueError("输出文件不能与输入文件相同")
+        out_dir = os.path.dirname(output_pdf)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        shutil.copyfile(input_pdf, output_pdf)
+        result["size"] = os.path.getsize(output_pdf)
+        result["status"] = "skipped"
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["elapsed"] = round(time.time() - start_time, 3)
+    return result
+
+
+def _scan_one(input_pdf: str, pages: List[int] | None = None) -> dict:
+    """只扫描单个文件，异常同样记录在结果中"""
+    start_time = time.time()
+    result = {"input": input_pdf}
+    try:
+        report = _batch_replacer.scan(input_pdf, pages=pages)
+        result.update(status="ok", summary=report["summary"], rules=report["rules"], pages=report["pages"])
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["elapsed"] = round(time.time() - start_time, 3)
+    return result
+
+
+def batch_replace(jobs: List[Tuple[str, str]], rules_source: str | Dict[str, str] | RuleSet,
+                  method: str = 'precise', workers: int = 0, report_path: str | None = None,
+                  fonts_dir: str = "fonts", save_profile: str | None = None, result_cache_dir: str | None = None,
+                  result_cache_mb: float = RESULTS_CACHE_MAX_MB, checkpoint_dir: str | None = None,
+                  dry_run: bool = False, index_path: str | None = None) -> Iterator[dict]:
+    """
+    批量执行PDF文本替换
+
+    Args:
+        jobs: (输入PDF, 输出PDF) 任务列表
+        rules_source: 替换规则，文件路径、规则字典或已编译的规则集，只编译一次后分发给所有工作进程
+        method: 替换方法 ('precise', 'overlay', 'hybrid')
+        workers: 进程数，0 表示使用 CPU 核数
+        report_path: JSONL 报告路径，每完成一个文件写入一行
+        fonts_dir: 本地字体目录
+        save_profile: 保存配置 ('fast', 'balanced', 'compact', 'incremental')；默认使用检查点时为 incremental，
+                      其他情况为 compact
+        result_cache_dir: 结果缓存目录，None 表示不使用缓存；启用时每个结果带 "cache": "hit"/"miss"
+        result_cache_mb: 结果缓存的容量上限(MB)
+        checkpoint_dir: 检查点目录，None 表示不记录；中断后重新运行同一批任务时，
+                        未完成的文件从各自的检查点继续
+        dry_run: 只扫描不替换，结果为各文件的扫描报告（见 PyMuPDFTextReplacer.scan），不写输出文件
+        index_path: 语料索引路径（见 corpus_index.py），只处理索引中可能命中的文件和页面；
+                    不可能命中的文件不打开，直接复制到输出路径，结果状态为 "skipped"
+
+    Yields:
+        每个文件的处理结果，按完成顺序产出
+    """
+    ruleset = PyMuPDFTextReplacer(rules_source, fonts_dir=fonts_dir).ruleset
+    selection = None
+    if index_path:
+        with CorpusIndex(index_path) as index:
+            selection = index.select(ruleset, [input_pdf for input_pdf, _ in jobs])
+    workers = workers or os.cpu_count() or 1
+    # 同时在途的任务数有上限，避免超大清单一次性堆积在内存中
+    max_pending = workers * 2
+
+    report = open(report_path, 'w', encoding='utf-8') if report_path else None
+
+    def emit(result: dict) -> dict:
+        if report:
+            report.write(json.dumps(result, ensure_ascii=False) + "\n")
+            report.flush()
+        return result
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker,
+                                 initargs=(ruleset, fonts_dir, result_cache_dir, result_cache_mb)) as pool:
+            pending = set()
+            job_iter = iter(jobs)
+            while True:
+                for input_pdf, output_pdf in job_iter:
+                    pages = selection.get(input_pdf) if selection is not None else None
+                    if pages == []:
+                        if dry_run:
+                            yield emit({"input": input_pdf, "method": method, "replacements": 0,
+                                        "status": "skipped", "elapsed": 0.0})
+                        else:
+                            yield emit(_copy_skipped(input_pdf, output_pdf, method))
+                        continue
+                    if dry_run:
+                        pending.add(pool.submit(_scan_one, input_pdf, pages))
+                    else:
+                        pending.add(pool.submit(_replace_one, input_pdf, output_pdf, method, save_profile,
+                                                checkpoint_dir, pages))
+                    if len(pending) >= max_pending:
+                        break
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield emit(future.result())
+    finally:
+        if report:
+            report.close()
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(
+        description='PDF批量文本替换工具',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+输入来源:
+  目录       - 递归处理目录中的所有PDF文件
+  通配符     - 例如 "exports/*.pdf"（请加引号，避免被shell展开）
+  清单文件   - 每行一个输入路径，或 "输入路径|输出路径"
+
+示例:
+  python batch_replacer.py exports/ rules.txt --output-dir replaced/
+  python batch_replacer.py "exports/*.pdf" rules.txt --output-dir replaced/ --workers 4
+  python batch_replacer.py manifest.txt rules.txt --output-dir replaced/ --report results.jsonl
+  python batch_replacer.py exports/ rules.txt --dry-run --report scan.jsonl
+  python batch_replacer.py exports/ rules.txt --output-dir replaced/ --index corpus.db
+        """
+    )
+    parser.add_argument('source', help='输入目录、通配符或清单文件')
+    parser.add_argument('rules_file', help='替换规则文件路径')
+    parser.add_argument('--output-dir', help='输出目录（--dry-run 时不需要）')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='只扫描不替换：每个文件各规则的命中次数和位置写入报告，不生成PDF')
+    parser.add_argument('--method', choices=['precise', 'overlay', 'hybrid'], default='precise',
+                        help='替换方法（默认: precise）')
+    parser.add_argument('--workers', type=int, default=0, help='并行处理的进程数（默认: CPU核数）')
+    parser.add_argument('--save-profile', choices=list(SAVE_PROFILES),
+                        help='保存配置（默认: compact，使用 --checkpoint-dir 时为 incremental）')
+    parser.add_argument('--report', default='batch_results.jsonl', help='JSONL结果报告路径（默认: batch_results.jsonl）')
+    parser.add_argument('--fonts-dir', default='fonts', help='本地字体目录（默认: fonts）')
+    parser.add_argument('--index', metavar='PATH',
+                        help='语料索引（由 corpus_index.py build 建立），只打开可能命中的文件和页面，'
+                             '不可能命中的文件原样复制到输出目录')
+    parser.add_argument('--checkpoint-dir', metavar='DIR',
+                        help='检查点目录：长文档每处理50页记录一次进度，中断后重新运行从检查点继续')
+    parser.add_argument('--case-sensitive', action='store_true', help='匹配时区分大小写')
+    parser.add_argument('--whole-word', action='store_true', help='只匹配完整单词')
+    parser.add_argument('--result-cache', nargs='?', const=RESULTS_CACHE_DIR, metavar='DIR',
+                        help=f'启用替换结果缓存，未变化的文件直接复用上次的输出（默认目录: {RESULTS_CACHE_DIR}）')
+    parser.add_argument('--result-cache-size', type=float, default=RESULTS_CACHE_MAX_MB, metavar='MB',
+                        help=f'结果缓存的容量上限，超出时淘汰最久未使用的条目（默认: {RESULTS_CACHE_MAX_MB}）')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.rules_file):
+        logger.error(f"规则文件不存在: {args.rules_file}")
+        sys.exit(1)
+
+    if not args.output_dir and not args.dry_run:
+        parser.error("需要指定 --output-dir")
+    ruleset = RuleSet.from_file(args.rules_file, case_sensitive=args.case_sensitive, whole_word=args.whole_word)
+    ruleset.log_summary(f"文件 {args.rules_file} ")
+
+    jobs = collect_jobs(args.source, args.output_dir or "")
+    if not jobs:
+        logger.error(f"没有找到需要处理的PDF文件: {args.source}")
+        sys.exit(1)
+    logger.info(f"共 {len(jobs)} 个文件待处理")
+
+    start_time = time.time()
+    succeeded, failed, total_replacements = 0, 0, 0
+    cache_hits, cache_misses, skipped = 0, 0, 0
+    for result in batch_replace(jobs, ruleset, method=args.method, workers=args.workers,
+                                report_path=args.report, fonts_dir=args.fonts_dir,
+                                save_profile=args.save_profile, result_cache_dir=args.result_cache,
+                                result_cache_mb=args.result_cache_size, checkpoint_dir=args.checkpoint_dir,
+                                dry_run=args.dry_run, index_path=args.index):
+        if result["status"] == "skipped":
+            skipped += 1
+        elif result["status"] == "ok" and args.dry_run:
+            succeeded += 1
+            total_replacements += result["summary"]["hits"]
+        elif result["status"] == "ok":
+            succeeded += 1
+            total_replacements += result["replacements"]
+            if result.get("cache") == "hit":
+                cache_hits += 1
+            elif result.get("cache") == "miss":
+                cache_misses += 1
+        else:
+            failed += 1
+            logger.error(f"✗ {result['input']}: {result['error']}")
+
+    if args.dry_run:
+        logger.info(f"扫描完成: 成功 {succeeded} 个，失败 {failed} 个，总计命中 {total_replacements} 处（未替换）")
+    else:
+        logger.info(f"批量处理完成: 成功 {succeeded} 个，失败 {failed} 个，总计替换 {total_replacements} 处")
+    if args.index:
+        logger.info(f"索引筛选: {skipped} 个文件不含任何规则原文，未打开")
+    if args.result_cache:
+        logger.info(f"结果缓存: 命中 {cache_hits} 个，未命中 {cache_misses} 个")
+    logger.info(f"耗时: {time.time() - start_time:.2f} 秒")
+    logger.info(f"结果报告: {args.report}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+PDF文本替换性能基准测试
+生成参数可控的合成PDF语料，按矩阵测量各替换方法、保存和验证的耗时、吞吐量(页/秒)及峰值内存，
+结果保存为JSON，可与之前的运行结果对比。完全离线运行。
+"""
+
+import sys
+import os
+import json
+import time
+import random
+import platform
+import argparse
+import itertools
+import logging
+import resource
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+import fitz  # PyMuPDF
+
+from pdf_replacer_pymupdf import PyMuPDFTextReplacer, SAVE_PROFILES, build_verification_report
+
+logger = logging.getLogger(__name__)
+
+FILLER_WORDS = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+                "incididunt ut labore et dolore magna aliqua").split()
+EMBEDDED_FONT_NAME = "LiberationSans-Bold"
+
+
+def make_rules(rule_count: int) -> Dict[str, str]:
+    """生成 rule_count 条互不重叠的规则，原文本形如 TOKEN00042"""
+    return {f"TOKEN{i:05d}": f"VALUE{i:05d}" for i in range(rule_count)}
+
+
+def generate_pdf(path: str, pages: int, lines_per_page: int, hits_per_page: int, rules: Dict[str, str],
+                 font: str = "builtin", fonts_dir: str = "fonts", seed: int = 0):
+    """
+    生成一个合成PDF
+
+    Args:
+        path: 输出路径
+        pages: 页数
+        lines_per_page: 每页文字行数（文本密度）
+        hits_per_page: 每页包含的规则原文数量
+        rules: 规则字典，命中的原文从中随机选取
+        font: 'builtin' 使用内置 Helvetica，'embedded' 嵌入 fonts 目录中的 LiberationSans-Bold
+        fonts_dir: 本地字体目录
+        seed: 随机种子，相同参数生成的文件内容相同
+    """
+    rng = random.Random(seed)
+    keys = list(rules)
+    doc = fitz.open()
+    font_file = os.path.join(fonts_dir, f"{EMBEDDED_FONT_NAME}.ttf")
+    for _ in range(pages):
+        page = doc.new_page()
+        fontname = "helv"
+        if font == "embedded":
+            page.insert_font(fontname="F1", fontfile=font_file)
+            fontname = "F1"
+        hit_lines = set(rng.sample(range(lines_per_page), min(hits_per_page, lines_per_page)))
+        line_height = (page.rect.height - 100) / max(lines_per_page, 1)
+        for line in range(lines_per_page):
+            words = rng.choices(FILLER_WORDS, k=8)
+            if line in hit_lines and keys:
+                words.insert(rng.randrange(len(words)), rng.choice(keys))
+            page.insert_text((50, 50 + line * line_height), " ".join(words), fontname=fontname,
+                             fontsize=min(10, line_height * 0.8))
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+
+
+def _run_case(case: dict, input_pdf: str, output_pdf: str, rules: Dict[str, str], fonts_dir: str) -> dict:
+    """在独立子进程中运行一个测试用例，峰值内存只统计本用例"""
+    logging.disable(logging.INFO)
+    replacer = PyMuPDFTextReplacer(rules, fonts_dir=fonts_dir)
+
+    start_time = time.perf_counter()
+    doc = fitz.open(input_pdf)
+    replacements = replacer._replace_doc(doc, case["method"])
+    replace_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    doc.save(output_pdf, **SAVE_PROFILES[case["save_profile"]])
+    doc.close()
+    save_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    report = build_verification_report(output_pdf, rules)
+    verify_time = time.perf_counter() - start_time
+
+    total_time = replace_time + save_time
+    return {
+        **case,
+        "replacements": replacements,
+        "remaining_rules": report["summary"]["remaining"],
+        "replace_s": round(replace_time, 4),
+        "save_s": round(save_time, 4),
+        "verify_s": round(verify_time, 4),
+        "total_s": round(total_time, 4),
+        "pages_per_s": round(case["pages"] / total_time, 2) if total_time else None,
+        # Linux 下 ru_maxrss 单位为 KB
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "output_kb": round(os.path.getsize(output_pdf) / 1024, 1),
+    }
+
+
+def run_benchmark(matrix: Dict[str, List], corpus_dir: str, fonts_dir: str = "fonts", repeat: int = 1) -> List[dict]:
+    """
+    按参数矩阵生成语料并运行基准测试
+
+    Args:
+        matrix: 各维度的取值列表，键为 pages/density/hits/rules/font/method/save_profile
+        corpus_dir: 合成语料与输出文件的存放目录，已生成的语料会被复用
+        fonts_dir: 本地字体目录
+        repeat: 每个用例重复次数，取耗时最短的一次
+
+    Returns:
+        每个用例的结果列表
+    """
+    os.makedirs(corpus_dir, exist_ok=True)
+    results = []
+    doc_keys = ("pages", "density", "hits", "rules", "font")
+    run_keys = ("method", "save_profile")
+
+    for doc_values in itertools.product(*(matrix[key] for key in doc_keys)):
+        doc_case = dict(zip(doc_keys, doc_values))
+        rules = make_rules(doc_case["rules"])
+        name = "bench_p{pages}_d{density}_h{hits}_r{rules}_{font}".format(**doc_case)
+        input_pdf = os.path.join(corpus_dir, f"{name}.pdf")
+        if not os.path.exists(input_pdf):
+            logger.info(f"生成语料: {input_pdf}")
+            generate_pdf(input_pdf, doc_case["pages"], doc_case["density"], doc_case["hits"], rules,
+                         font=doc_case["font"], fonts_dir=fonts_dir)
+
+        for run_values in itertools.product(*(matrix[key] for key in run_keys)):
+            case = {**doc_case, **dict(zip(run_keys, run_values))}
+            output_pdf = os.path.join(corpus_dir, f"{name}_{case['method']}_{case['save_profile']}.out.pdf")
+            best = None
+            for _ in range(repeat):
+                with ProcessPoolExecutor(max_workers=1) as pool:
+                    result = pool.submit(_run_case, case, input_pdf, output_pdf, rules, fonts_dir).result()
+                if best is None or result["total_s"] < best["total_s"]:
+                    best = result
+            logger.info(f"{name} {case['method']}/{case['save_profile']}: {best['total_s']:.3f} 秒, "
+                        f"{best['pages_per_s']} 页/秒, 峰值内存 {best['peak_rss_mb']} MB")
+            results.append(best)
+    return results
+
+
+def compare_results(baseline_path: str, current_path: str):
+    """对比两次基准测试结果，输出相同用例的耗时和内存变化"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(current_path, 'r', encoding='utf-8') as f:
+        current = json.load(f)
+
+    case_keys = ("pages", "density", "hits", "rules", "font", "method", "save_profile")
+    old_results = {tuple(r[k] for k in case_keys): r for r in baseline["results"]}
+    print(f"{'用例':<52} {'耗时(旧)':>9} {'耗时(新)':>9} {'变化':>8} {'内存(旧)':>9} {'内存(新)':>9}")
+    for result in current["results"]:
+        key = tuple(result[k] for k in case_keys)
+        old = old_results.get(key)
+        if old is None:
+            continue
+        label = "p{}_d{}_h{}_r{}_{} {}/{}".format(*key)
+        change = (result["total_s"] / old["total_s"] - 1) * 100 if old["total_s"] else 0.0
+        print(f"{label:<52} {old['total_s']:>9.3f} {result['total_s']:>9.3f} {change:>+7.1f}% "
+              f"{old['peak_rss_mb']:>9.1f} {result['peak_rss_mb']:>9.1f}")
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",")]
+
+
+def _str_list(value: str) -> List[str]:
+    return [v.strip() for v in value.split(",")]
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(
+        description='PDF文本替换性能基准测试',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+  python benchmark.py --output bench_base.json
+  python benchmark.py --pages 10,200 --rules 10,2000 --method precise,hybrid --output bench_new.json
+  python benchmark.py --compare bench_base.json bench_new.json
+        """
+    )
+    parser.add_argument('--pages', type=_int_list, default=[10, 100], help='页数列表（默认: 10,100）')
+    parser.add_argument('--density', type=_int_list, default=[40], help='每页文字行数列表（默认: 40）')
+    parser.add_argument('--hits', type=_int_list, default=[2], help='每页命中数列表（默认: 2）')
+    parser.add_argument('--rules', type=_int_list, default=[10, 1000], help='规则条数列表（默认: 10,1000）')
+    parser.add_argument('--font', type=_str_list, default=['builtin', 'embedded'],
+                        help='字体类型列表 builtin/embedded（默认: 两者）')
+    parser.add_argument('--method', type=_str_list, default=['precise', 'overlay', 'hybrid'],
+                        help='替换方法列表（默认: 全部）')
+    parser.add_argument('--save-profile', type=_str_list, default=['compact'],
+                        help=f"保存配置列表，可选 {', '.join(p for p in SAVE_PROFILES if p != 'incremental')}（默认: compact）")
+    parser.add_argument('--repeat', type=int, default=1, help='每个用例重复次数，取最快一次（默认: 1）')
+    parser.add_argument('--corpus-dir', default='bench_corpus', help='语料目录（默认: bench_corpus）')
+    parser.add_argument('--fonts-dir', default='fonts', help='本地字体目录（默认: fonts）')
+    parser.add_argument('--output', default='bench_results.json', help='结果文件（默认: bench_results.json）')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'), help='对比两个结果文件')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare_results(*args.compare)
+        return
+
+    if 'incremental' in args.save_profile:
+        logger.error("基准测试不支持 incremental 保存配置（需要在输入文件副本上原地保存）")
+        sys.exit(1)
+
+    matrix = {"pages": args.pages, "density": args.density, "hits": args.hits, "rules": args.rules,
+              "font": args.font, "method": args.method, "save_profile": args.save_profile}
+    start_time = time.time()
+    results = run_benchmark(matrix, args.corpus_dir, fonts_dir=args.fonts_dir, repeat=args.repeat)
+
+    meta = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+            "pymupdf": fitz.VersionBind, "platform": platform.platform(), "cpu_count": os.cpu_count()}
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({"meta": meta, "matrix": matrix, "results": results}, f, ensure_ascii=False, indent=2)
+    logger.info(f"基准测试完成，共 {len(results)} 个用例，耗时 {time.time() - start_time:.1f} 秒")
+    logger.info(f"结果已保存: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
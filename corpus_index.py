@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+PDF语料倒排索引
+对整个语料只提取一次文本，建立 词项 -> (文件, 页) 的倒排索引并保存在 SQLite 中；
+按文件修改时间和内容哈希增量更新。应用新规则集时先查索引，只打开可能命中的文档和页面。
+"""
+
+import os
+import re
+import sys
+import json
+import sqlite3
+import hashlib
+import argparse
+import logging
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Iterable, List, Set, Tuple
+
+import fitz  # PyMuPDF
+
+from pdf_replacer_pymupdf import PyMuPDFTextReplacer, RuleSet
+
+logger = logging.getLogger(__name__)
+
+# 中日韩文字之间没有空格分词，逐字作为词项；其余按连续的字母、数字、下划线切分
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af"
+_TERM_RE = re.compile(f"[{_CJK}]|[^\\W{_CJK}]+")
+_CJK_RE = re.compile(f"[{_CJK}]")
+# 行尾连字符断开的单词，匹配器会去掉连字符连起来匹配，索引中同时收录连起来的词项
+_HYPHEN_BREAK_RE = re.compile(r"(\w)-\n(?=\w)")
+
+# 索引格式版本，词项切分或表结构变化时递增，旧索引会被清空重建
+INDEX_VERSION = 2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    pages INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS terms (
+    id INTEGER PRIMARY KEY,
+    term TEXT UNIQUE NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term_id INTEGER NOT NULL,
+    file_id INTEGER NOT NULL,
+    pages TEXT NOT NULL,
+    PRIMARY KEY (term_id, file_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_file ON postings (file_id);
+"""
+
+
+def _fold(text: str) -> str:
+    """大小写折叠，索引与查询使用同一种折叠，区分大小写的规则查到的是超集"""
+    return text.lower()
+
+
+def _extract_terms(input_pdf: str, known_sha256: str | None) -> Tuple[str, int, Dict[str, List[int]] | None]:
+    """
+    在工作进程中计算文件哈希并提取每页的词项
+
+    Returns:
+        (sha256, 页数, {词项: [页码, ...]})；内容与 known_sha256 相同时不提取，页数为 -1、词项为 None
+    """
+    digest = hashlib.sha256()
+    with open(input_pdf, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    sha256 = digest.hexdigest()
+    if sha256 == known_sha256:
+        return sha256, -1, None
+
+    terms: Dict[str, List[int]] = {}
+    with fitz.open(input_pdf) as doc:
+        page_count = len(doc)
+        for page_num, page in enumerate(doc):
+            text = _fold(page.get_text("text"))
+            page_terms = set(_TERM_RE.findall(text))
+            page_terms.update(_TERM_RE.findall(_HYPHEN_BREAK_RE.sub(r"\1", text)))
+            for term in page_terms:
+                terms.setdefault(term, []).append(page_num)
+    return sha256, page_count, terms
+
+
+class CorpusIndex:
+    """
+    语料倒排索引：词项 -> (文件, 页)
+
+    规则原文按与页面文本相同的方式切分词项。两侧都以非单词字符为界的词项（以及单个中日韩文字）
+    在命中的页面上必然完整出现，取这些词项所在页面的交集即为候选页；规则只有首尾两个
+    可能不完整的词项时，先在词表中查找包含它的词项再取并集。候选页是实际命中页的超集。
+    """
+
+    def __init__(self, index_path: str):
+        self.index_path = index_path
+        self.conn = sqlite3.connect(index_path)
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != INDEX_VERSION:
+            if version:
+                logger.warning(f"索引格式已变化（{version} -> {INDEX_VERSION}），重建索引")
+            self.conn.executescript("DROP TABLE IF EXISTS postings; DROP TABLE IF EXISTS terms; "
+                                    "DROP TABLE IF EXISTS files;")
+            self.conn.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self) -> "CorpusIndex":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def update(self, paths: Iterable[str], workers: int = 0) -> Dict[str, int]:
+        """
+        增量更新索引：大小和修改时间都未变化的文件直接跳过，变化的文件比较内容哈希，
+        内容也变化时才重新提取；已从磁盘删除的文件从索引中移除
+
+        Args:
+            paths: PDF文件路径
+            workers: 提取文本的进程数，0 表示使用 CPU 核数
+
+        Returns:
+            {"added", "updated", "unchanged", "removed", "failed"} 各类文件数
+        """
+        stats = dict.fromkeys(("added", "updated", "unchanged", "removed", "failed"), 0)
+        known = {path: (file_id, size, mtime_ns, sha256) for file_id, path, size, mtime_ns, sha256
+                 in self.conn.execute("SELECT id, path, size, mtime_ns, sha256 FROM files")}
+
+        pending: Dict[str, os.stat_result] = {}
+        for path in dict.fromkeys(os.path.abspath(p) for p in paths):
+            try:
+                stat = os.stat(path)
+            except OSError as e:
+                logger.warning(f"无法读取文件，跳过: {path}: {e}")
+                stats["failed"] += 1
+                continue
+            row = known.get(path)
+            if row and row[1] == stat.st_size and row[2] == stat.st_mtime_ns:
+                stats["unchanged"] += 1
+            else:
+                pending[path] = stat
+
+        for path, (file_id, *_) in known.items():
+            if not os.path.exists(path):
+                self._remove_file(file_id)
+                stats["removed"] += 1
+
+        if pending:
+            logger.info(f"需要检查 {len(pending)} 个新增或修改过的文件")
+            workers = workers or os.cpu_count() or 1
+            done = 0
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                # 同时在途的任务数有上限，提取结果写入索引后即释放
+                futures = {}
+                path_iter = iter(pending)
+                while True:
+                    for path in path_iter:
+                        known_sha256 = known[path][3] if path in known else None
+                        futures[pool.submit(_extract_terms, path, known_sha256)] = path
+                        if len(futures) >= workers * 2:
+                            break
+                    if not futures:
+                        break
+                    finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        path = futures.pop(future)
+                        self._apply_extraction(path, pending[path], known.get(path), future, stats)
+                        done += 1
+                        if done % 100 == 0:
+                            self.conn.commit()
+                            logger.info(f"已检查 {done}/{len(pending)} 个文件")
+        self.conn.commit()
+        logger.info("索引更新完成: " + ", ".join(f"{name} {count}" for name, count in stats.items()))
+        return stats
+
+    def _apply_extraction(self, path: str, stat: os.stat_result, row: tuple | None, future, stats: Dict[str, int]):
+        """将一个文件的提取结果写入索引"""
+        try:
+            sha256, page_count, terms = future.result()
+        except Exception as e:
+            logger.warning(f"提取文本失败，该文件不会被索引: {path}: {type(e).__name__}: {e}")
+            if row:
+                self._remove_file(row[0])
+            stats["failed"] += 1
+            return
+        if terms is None:
+            # 只是修改时间变化，内容未变
+            self.conn.execute("UPDATE files SET size = ?, mtime_ns = ? WHERE id = ?",
+                              (stat.st_size, stat.st_mtime_ns, row[0]))
+            stats["unchanged"] += 1
+        else:
+            self._store_file(path, stat, sha256, page_count, terms)
+            stats["updated" if row else "added"] += 1
+
+    def _remove_file(self, file_id: int):
+        self.conn.execute("DELETE FROM postings WHERE file_id = ?", (file_id,))
+        self.conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+    def _store_file(self, path: str, stat: os.stat_result, sha256: str, page_count: int,
+                    terms: Dict[str, List[int]]):
+        row = self.conn.execute("SELECT id FROM files WHERE path = ?", (path,)).fetchone()
+        if row:
+            file_id = row[0]
+            self.conn.execute("DELETE FROM postings WHERE file_id = ?", (file_id,))
+            self.conn.execute("UPDATE files SET size = ?, mtime_ns = ?, sha256 = ?, pages = ? WHERE id = ?",
+                              (stat.st_size, stat.st_mtime_ns, sha256, page_count, file_id))
+        else:
+            file_id = self.conn.execute(
+                "INSERT INTO files (path, size, mtime_ns, sha256, pages) VALUES (?, ?, ?, ?, ?)",
+                (path, stat.st_size, stat.st_mtime_ns, sha256, page_count)).lastrowid
+
+        self.conn.executemany("INSERT OR IGNORE INTO terms (term) VALUES (?)", ((term,) for term in terms))
+        term_ids: Dict[str, int] = {}
+        words = list(terms)
+        # 分批查询，避免超出 SQLite 的参数个数上限
+        for start in range(0, len(words), 500):
+            chunk = words[start:start + 500]
+            term_ids.update((term, term_id) for term_id, term in self.conn.execute(
+                f"SELECT id, term FROM terms WHERE term IN ({','.join('?' * len(chunk))})", chunk))
+        self.conn.executemany("INSERT INTO postings (term_id, file_id, pages) VALUES (?, ?, ?)",
+                              ((term_ids[term], file_id, ",".join(map(str, pages)))
+                               for term, pages in terms.items()))
+
+    def _postings(self, term_ids: Iterable[int], cache: Dict[int, Dict[int, Set[int]]]) -> Dict[int, Set[int]]:
+        """若干词项的 {文件ID: 页码集合} 的并集"""
+        result: Dict[int, Set[int]] = {}
+        for term_id in term_ids:
+            if term_id not in cache:
+                cache[term_id] = {file_id: set(map(int, pages.split(","))) for file_id, pages in self.conn.execute(
+                    "SELECT file_id, pages FROM postings WHERE term_id = ?", (term_id,))}
+            for file_id, pages in cache[term_id].items():
+                result.setdefault(file_id, set()).update(pages)
+        return result
+
+    def _rule_pages(self, old_text: str, whole_word: bool,
+                    cache: Dict[int, Dict[int, Set[int]]]) -> Dict[int, Set[int]] | None:
+        """
+        一条规则的候选 {文件ID: 页码集合}；规则中没有任何词项时无法筛选，返回 None
+        """
+        key = re.sub(r"\s+", " ", _fold(old_text)).strip()
+        tokens = [(m.start(), m.end(), m.group()) for m in _TERM_RE.finditer(key)]
+        if not tokens:
+            return None
+
+        closed, open_tokens = [], []
+        for start, end, term in tokens:
+            # 首尾的词项在页面上可能是更长单词的一部分（整词匹配时除外）
+            open_start = start == 0 and not whole_word and not _CJK_RE.fullmatch(term)
+            open_end = end == len(key) and not whole_word and not _CJK_RE.fullmatch(term)
+            if open_start or open_end:
+                open_tokens.append((term, open_start, open_end))
+            else:
+                closed.append(term)
+
+        if closed:
+            term_ids = []
+            for term in dict.fromkeys(closed):
+                row = self.conn.execute("SELECT id FROM terms WHERE term = ?", (term,)).fetchone()
+                if row is None:
+                    return {}
+                term_ids.append(row[0])
+            # 从出现文件最少的词项开始取交集
+            term_ids.sort(key=lambda term_id: self.conn.execute(
+                "SELECT COUNT(*) FROM postings WHERE term_id = ?", (term_id,)).fetchone()[0])
+            candidates = self._postings(term_ids[:1], cache)
+            for term_id in term_ids[1:]:
+                if not candidates:
+                    break
+                postings = self._postings([term_id], cache)
+                candidates = {file_id: pages & postings[file_id] for file_id, pages in candidates.items()
+                              if file_id in postings and pages & postings[file_id]}
+            return candidates
+
+        # 只有不完整的词项：取最长的一个，在词表中查找以它结尾、开头或包含它的词项
+        term, open_start, open_end = max(open_tokens, key=lambda token: len(token[0]))
+        if open_start and open_end:
+            rows = self.conn.execute("SELECT id FROM terms WHERE instr(term, ?) > 0", (term,))
+        elif open_end:
+            rows = self.conn.execute("SELECT id FROM terms WHERE term >= ? AND term < ?", (term, term + "\U0010ffff"))
+        else:
+            rows = self.conn.execute("SELECT id FROM terms WHERE term LIKE ? ESCAPE '\\'",
+                                     ("%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_"),))
+        return self._postings([row[0] for row in rows], cache)
+
+    def select(self, ruleset: RuleSet, paths: Iterable[str]) -> Dict[str, List[int] | None]:
+        """
+        为每个文件给出需要处理的页面
+
+        Returns:
+            {路径: 页码列表（从0开始）}；空列表表示该文件不可能命中任何规则，
+            None 表示文件不在索引中、索引后被修改过，或规则无法用索引筛选，需要完整处理
+        """
+        paths = list(paths)
+        files = {path: (file_id, size, mtime_ns) for file_id, path, size, mtime_ns
+                 in self.conn.execute("SELECT id, path, size, mtime_ns FROM files")}
+        cache: Dict[int, Dict[int, Set[int]]] = {}
+        candidates: Dict[int, Set[int]] | None = {}
+        for old_text in ruleset.rules:
+            rule_pages = self._rule_pages(old_text, ruleset.whole_word, cache)
+            if rule_pages is None:
+                logger.warning(f"规则原文 '{old_text}' 不含可索引的词项，所有文件都需要完整处理")
+                candidates = None
+                break
+            for file_id, pages in rule_pages.items():
+                candidates.setdefault(file_id, set()).update(pages)
+
+        selection: Dict[str, List[int] | None] = {}
+        for path in paths:
+            row = files.get(os.path.abspath(path))
+            try:
+                stat = os.stat(path)
+            except OSError:
+                stat = None
+            if candidates is None or row is None or stat is None \
+                    or (stat.st_size, stat.st_mtime_ns) != (row[1], row[2]):
+                selection[path] = None
+            else:
+                selection[path] = sorted(candidates.get(row[0], ()))
+        return selection
+
+
+def main():
+    """主函数"""
+    from batch_replacer import collect_jobs
+
+    parser = argparse.ArgumentParser(
+        description='PDF语料倒排索引',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+  python corpus_index.py build archive/ --index corpus.db
+  python corpus_index.py query archive/ rules.txt --index corpus.db --output candidates.json
+  python batch_replacer.py archive/ rules.txt --output-dir replaced/ --index corpus.db
+        """
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build', help='建立或增量更新索引')
+    build.add_argument('source', help='输入目录、通配符或清单文件')
+    build.add_argument('--index', required=True, help='索引文件路径')
+    build.add_argument('--workers', type=int, default=0, help='提取文本的进程数（默认: CPU核数）')
+    query = subparsers.add_parser('query', help='列出规则集可能命中的文件和页面')
+    query.add_argument('source', help='输入目录、通配符或清单文件')
+    query.add_argument('rules_file', help='替换规则文件路径')
+    query.add_argument('--index', required=True, help='索引文件路径')
+    query.add_argument('--output', metavar='PATH', help='将候选文件和页码（从1开始）保存为JSON')
+    args = parser.parse_args()
+
+    inputs = [input_pdf for input_pdf, _ in collect_jobs(args.source, "")]
+    if not inputs:
+        logger.error(f"没有找到PDF文件: {args.source}")
+        sys.exit(1)
+
+    with CorpusIndex(args.index) as index:
+        if args.command == 'build':
+            stats = index.update(inputs, workers=args.workers)
+            if stats["failed"]:
+                sys.exit(1)
+            return
+
+        ruleset = PyMuPDFTextReplacer(args.rules_file).ruleset
+        selection = index.select(ruleset, inputs)
+
+    unindexed = [path for path, pages in selection.items() if pages is None]
+    matched = {path: pages for path, pages in selection.items() if pages}
+    logger.info(f"{len(inputs)} 个文件中 {len(matched)} 个可能命中，共 {sum(map(len, matched.values()))} 页；"
+                f"{len(unindexed)} 个未索引或已修改，需要完整处理")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"candidates": {path: [page + 1 for page in pages] for path, pages in matched.items()},
+                       "unindexed": unindexed}, f, ensure_ascii=False, indent=2)
+        logger.info(f"候选列表已保存: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,25 +2,31 @@ import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import os
 import sys
+import queue
 import threading
+import asyncio
 import logging
-from pdf_replacer_pymupdf import PyMuPDFTextReplacer, verify_replacements
+from async_replacer import AsyncReplacer
+from pdf_replacer_pymupdf import detail_logger, verify_replacements
+
+# 日志框每隔 LOG_POLL_MS 毫秒批量写入一次，每批最多 LOG_BATCH_SIZE 条，只保留最近 MAX_LOG_LINES 行
+LOG_POLL_MS = 100
+LOG_BATCH_SIZE = 500
+MAX_LOG_LINES = 2000
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
 
 # --- GUI Logger ---
-class TextHandler(logging.Handler):
-    """自定义日志处理器，将日志记录重定向到Tkinter的Text小部件"""
-    def __init__(self, text_widget):
+class QueueLogHandler(logging.Handler):
+    """日志处理器：只把格式化后的日志放入队列，不触碰Tk，由主线程定时批量取出写入文本框"""
+    def __init__(self, log_queue):
         super().__init__()
-        self.text_widget = text_widget
+        self.log_queue = log_queue
 
     def emit(self, record):
-        msg = self.format(record)
-        def append():
-            self.text_widget.configure(state='normal')
-            self.text_widget.insert(tk.END, msg + '\n')
-            self.text_widget.configure(state='disabled')
-            self.text_widget.yview(tk.END)
-        self.text_widget.after(0, append)
+        try:
+            self.log_queue.put_nowait(self.format(record))
+        except Exception:
+            self.handleError(record)
 
 # --- 主应用 ---
 class App(tk.Tk):
@@ -34,6 +40,12 @@ class App(tk.Tk):
         self.output_pdf_path = tk.StringVar()
         self.method = tk.StringVar(value='precise')
         self.verify = tk.BooleanVar(value=True)
+        self.detail_to_file = tk.BooleanVar(value=False)
+        self.log_queue = queue.SimpleQueue()
+        self.progress_text = tk.StringVar(value="")
+        # 处理线程中运行的事件循环和任务，供“取消”按钮跨线程取消
+        self._loop = None
+        self._task = None
 
         # --- UI 布局 ---
         main_frame = ttk.Frame(self, padding="10")
@@ -54,9 +66,10 @@ class App(tk.Tk):
         options_frame.pack(fill=tk.X, pady=5)
         self._create_options_widgets(options_frame)
 
-        # 控制按钮
-        run_button = ttk.Button(main_frame, text="开始处理", command=self.start_processing_thread)
-        run_button.pack(pady=10, fill=tk.X)
+        # 控制按钮和进度
+        control_frame = ttk.Frame(main_frame)
+        control_frame.pack(pady=10, fill=tk.X)
+        self._create_control_widgets(control_frame)
 
         # 日志输出
         log_frame = ttk.LabelFrame(main_frame, text="日志", padding="10")
@@ -95,12 +108,27 @@ class App(tk.Tk):
         verify_check = ttk.Checkbutton(parent, text="处理后验证结果", variable=self.verify)
         verify_check.pack(side=tk.RIGHT, padx=20)
 
+        detail_check = ttk.Checkbutton(parent, text="逐页详细日志写入文件", variable=self.detail_to_file)
+        detail_check.pack(side=tk.RIGHT, padx=5)
+
+    def _create_control_widgets(self, parent):
+        self.run_button = ttk.Button(parent, text="开始处理", command=self.start_processing_thread)
+        self.run_button.grid(row=0, column=0, sticky=tk.EW)
+        self.cancel_button = ttk.Button(parent, text="取消", command=self.cancel_processing, state='disabled')
+        self.cancel_button.grid(row=0, column=1, padx=(5, 0))
+
+        self.progress_bar = ttk.Progressbar(parent, mode='determinate')
+        self.progress_bar.grid(row=1, column=0, sticky=tk.EW, pady=(5, 0))
+        ttk.Label(parent, textvariable=self.progress_text, width=16).grid(row=1, column=1, padx=(5, 0), pady=(5, 0))
+
+        parent.columnconfigure(0, weight=1)
+
     def _create_log_widget(self, parent):
-        log_text = tk.Text(parent, state='disabled', wrap=tk.WORD, height=10)
-        log_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar = ttk.Scrollbar(parent, command=log_text.yview)
+        self.log_text = tk.Text(parent, state='disabled', wrap=tk.WORD, height=10)
+        self.log_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar = ttk.Scrollbar(parent, command=self.log_text.yview)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        log_text['yscrollcommand'] = scrollbar.set
+        self.log_text['yscrollcommand'] = scrollbar.set
 
         # 设置日志
         logger = logging.getLogger()
@@ -109,10 +137,30 @@ class App(tk.Tk):
         for handler in logger.handlers[:]:
             logger.removeHandler(handler)
         # 添加GUI处理器
-        gui_handler = TextHandler(log_text)
-        gui_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+        gui_handler = QueueLogHandler(self.log_queue)
+        gui_handler.setFormatter(logging.Formatter(LOG_FORMAT))
         logger.addHandler(gui_handler)
+        self.after(LOG_POLL_MS, self._drain_log_queue)
 
+    def _drain_log_queue(self):
+        """在主线程中批量取出日志，一次写入文本框，并截掉超出上限的旧日志"""
+        lines = []
+        try:
+            while len(lines) < LOG_BATCH_SIZE:
+                lines.append(self.log_queue.get_nowait())
+        except queue.Empty:
+            pass
+
+        if lines:
+            self.log_text.configure(state='normal')
+            self.log_text.insert(tk.END, "\n".join(lines) + "\n")
+            line_count = int(self.log_text.index('end-1c').split('.')[0]) - 1
+            if line_count > MAX_LOG_LINES:
+                self.log_text.delete('1.0', f'{line_count - MAX_LOG_LINES + 1}.0')
+            self.log_text.configure(state='disabled')
+            self.log_text.yview(tk.END)
+        # 队列中还有积压时尽快继续，同时让出主循环处理界面事件
+        self.after(1 if len(lines) == LOG_BATCH_SIZE else LOG_POLL_MS, self._drain_log_queue)
 
 
     def browse_input_pdf(self):
@@ -140,10 +188,49 @@ class App(tk.Tk):
 
     def start_processing_thread(self):
         # 在新线程中运行，防止GUI冻结
+        self.run_button.configure(state='disabled')
+        self.cancel_button.configure(state='normal')
+        self.progress_bar['value'] = 0
+        self.progress_text.set("")
         processing_thread = threading.Thread(target=self.process_pdf, daemon=True)
         processing_thread.start()
 
+    def cancel_processing(self):
+        """请求取消：当前页处理完后停止，不写出输出文件"""
+        if self._loop is not None and self._task is not None:
+            self.cancel_button.configure(state='disabled')
+            self.progress_text.set("正在取消...")
+            self._loop.call_soon_threadsafe(self._task.cancel)
+
+    def update_progress(self, event):
+        """在主线程中更新进度条"""
+        self.progress_bar['maximum'] = event["pages"]
+        self.progress_bar['value'] = event["page"]
+        self.progress_text.set(f"{event['page']}/{event['pages']} 页")
+
+    def _processing_finished(self):
+        self._loop = self._task = None
+        self.run_button.configure(state='normal')
+        self.cancel_button.configure(state='disabled')
+
+    async def replace_async(self, rules, input_pdf, output_pdf):
+        """在处理线程的事件循环中执行替换，逐页进度转交给主线程"""
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.current_task()
+        # 使用线程模式：日志直接显示在GUI中，字体目录与打包后的资源路径一致
+        async with AsyncReplacer(rules, fonts_dir=self.get_resource_path('fonts'), processes=False) as replacer:
+            logging.info(f"字体目录设置为: {replacer.fonts_dir}")
+            await replacer.replace_pdf(input_pdf, output_pdf, method=self.method.get(),
+                                       progress=lambda event: self.after(0, self.update_progress, event))
+            return replacer.ruleset
+
     def process_pdf(self):
+        try:
+            self._process_pdf()
+        finally:
+            self.after(0, self._processing_finished)
+
+    def _process_pdf(self):
         input_pdf = self.input_pdf_path.get()
         output_pdf = self.output_pdf_path.get()
         rules_text = self.rules_text.get("1.0", tk.END)
@@ -175,19 +262,25 @@ class App(tk.Tk):
             messagebox.showerror("错误", "没有有效的规则可供使用！")
             return
 
+        # 逐页、逐规则的详细日志可以只写入文件，日志框只显示概要
+        detail_handler = None
+        if self.detail_to_file.get():
+            detail_log = f"{os.path.splitext(output_pdf)[0]}.log"
+            detail_handler = logging.FileHandler(detail_log, mode='w', encoding='utf-8')
+            detail_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+            detail_logger.addHandler(detail_handler)
+            detail_logger.propagate = False
+            logging.info(f"详细日志写入: {detail_log}")
+
         try:
             logging.info("="*30)
             logging.info("开始处理...")
             
             # 关键：直接将规则字典传递给替换器
-            replacer = PyMuPDFTextReplacer(rules)
-            replacer.fonts_dir = self.get_resource_path('fonts')
-            logging.info(f"字体目录设置为: {replacer.fonts_dir}")
-
-            replacer.replace_pdf(input_pdf, output_pdf, method=self.method.get())
+            compiled_rules = asyncio.run(self.replace_async(rules, input_pdf, output_pdf))
 
             if self.verify.get():
-                failed_rules = verify_replacements(output_pdf, replacer.rules)
+                failed_rules = verify_replacements(output_pdf, compiled_rules)
                 if failed_rules:
                     logging.warning(f"有 {len(failed_rules)} 条规则未成功替换。")
                 else:
@@ -196,11 +289,19 @@ class App(tk.Tk):
             logging.info("处理全部完成！")
             messagebox.showinfo("成功", f"处理完成！\n输出文件保存在: {output_pdf}")
 
+        except asyncio.CancelledError:
+            logging.warning("处理已取消，未写出输出文件。")
+            self.after(0, self.progress_text.set, "已取消")
         except Exception as e:
             logging.error(f"发生严重错误: {e}")
             import traceback
             logging.error(traceback.format_exc())
             messagebox.showerror("严重错误", f"处理失败，请查看日志获取详情。\n错误: {e}")
+        finally:
+            if detail_handler:
+                detail_logger.removeHandler(detail_handler)
+                detail_logger.propagate = True
+                detail_handler.close()
 
 if __name__ == '__main__':
     app = App()
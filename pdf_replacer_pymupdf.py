@@ -6,13 +6,27 @@ PDF文本替换脚本 - PyMuPDF优化版（最终兼容版）
 
 import sys
 import os
+import io
+import re
 import time
 import argparse
-from typing import Dict, List, Tuple
+import json
+import pickle
+import hashlib
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Tuple
+from collections import defaultdict, deque
+from contextlib import ExitStack, contextmanager
 import logging
 import fitz  # PyMuPDF
 import tempfile
 import shutil
+import gc
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
 
 # 设置日志
 logging.basicConfig(
@@ -20,59 +34,850 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
+# 逐页、逐处、逐规则的详细日志，大文档上数量很多；默认与主日志一起输出，
+# 调用方（如 GUI）可以单独把它转到文件
+detail_logger = logging.getLogger(f"{__name__}.detail")
 
+# 替换逻辑或输出格式变化时递增，结果缓存以此区分不同版本生成的输出
+__version__ = "1.1.1"
 
-class PyMuPDFTextReplacer:
-    """使用PyMuPDF的文本替换器"""
 
-    def __init__(self, rules_source: str | Dict[str, str]):
+# 保存配置：fast 速度优先，compact 体积优先，incremental 只追加写入改动过的对象
+SAVE_PROFILES = {
+    'fast': {'garbage': 0, 'deflate': False, 'clean': False},
+    'balanced': {'garbage': 1, 'deflate': True, 'clean': False},
+    'compact': {'garbage': 4, 'deflate': True, 'clean': True},
+    'incremental': {'incremental': True, 'deflate': True, 'encryption': fitz.PDF_ENCRYPT_KEEP},
+}
+
+# PDF 内置的 Base-14 字体，无需从本地加载字体文件
+BUILTIN_FONTS = ["helv", "cour", "timo", "symb", "zadb", "times", "courier", "helvetica", "symbol",
+                 "zapfdingbats"]
+
+
+class _RuleMatcher:
+    """
+    多模式匹配器：基于规则原文构建一次 Aho-Corasick 自动机，
+    对每页文本只扫描一遍即可找出所有规则的命中位置。
+
+    默认匹配语义与 page.search_for 保持一致：忽略大小写，连续空白和换行视为一个空格，
+    同一规则的命中互不重叠；跨行的命中按行拆成多个矩形。此外行尾连字符断开的单词也能命中。
+
+    Args:
+        patterns: 规则原文
+        case_sensitive: 区分大小写
+        whole_word: 只匹配完整单词（命中两侧不能紧邻字母、数字或下划线）
+        longest: 不同规则的命中互相重叠时只保留最左、最长的一个，
+                 例如同时有 "Manager" 和 "Manager A" 时，"Manager A" 只按后者替换一次
+    """
+
+    def __init__(self, patterns: Iterable[str], case_sensitive: bool = False, whole_word: bool = False,
+                 longest: bool = False):
+        self.case_sensitive = case_sensitive
+        self.whole_word = whole_word
+        self.longest = longest
+        self.patterns: List[str] = []
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        self._lengths: List[int] = []
+
+        for pattern in patterns:
+            key = self._normalize(pattern, case_sensitive)
+            index = len(self.patterns)
+            self.patterns.append(pattern)
+            self._lengths.append(len(key))
+            if not key:
+                continue
+            state = 0
+            for ch in key:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = nxt
+            self._out[state].append(index)
+
+        # 按广度优先顺序构建失败指针，并合并输出集合
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    @staticmethod
+    def _fold(ch: str) -> str:
+        """单字符大小写折叠，空白统一为空格（保证折叠前后长度一致）"""
+        if ch.isspace():
+            return " "
+        lower = ch.lower()
+        return lower if len(lower) == 1 else ch
+
+    @staticmethod
+    def _fold_space(ch: str) -> str:
+        """区分大小写时只统一空白"""
+        return " " if ch.isspace() else ch
+
+    @classmethod
+    def _normalize(cls, text: str, case_sensitive: bool = False) -> str:
+        fold = cls._fold_space if case_sensitive else cls._fold
+        return re.sub(" +", " ", "".join(fold(ch) for ch in text))
+
+    @staticmethod
+    def _is_word_char(ch: str) -> bool:
+        return ch.isalnum() or ch == "_"
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, int]]:
         """
-        初始化替换器
+        扫描已归一化的文本，按结束位置顺序产出 (起始下标, 结束下标, 规则序号)
+        """
+        state = 0
+        goto, fail, out, lengths = self._goto, self._fail, self._out, self._lengths
+        for pos, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for index in out[state]:
+                yield pos - lengths[index] + 1, pos + 1, index
 
-        Args:
-            rules_source: 替换规则，可以是文件路径(str)或规则字典(dict)
+    def has_match(self, text: str) -> bool:
+        """
+        快速判断纯文本中是否可能包含任一规则，用于页面预筛选
+
+        纯文本中的换行也按空白处理，行尾连字符断开的单词另按去掉连字符后的文本再查一次，
+        因此结果只可能多报、不会漏报。
         """
-        if isinstance(rules_source, dict):
-            self.rules = rules_source
-            logger.info(f"从字典加载了 {len(self.rules)} 条替换规则")
+        if next(self.iter_matches(self._normalize(text, self.case_sensitive)), None) is not None:
+            return True
+        joined = re.sub(r"(\w)-\n(?=\w)", r"\1", text)
+        if joined == text:
+            return False
+        return next(self.iter_matches(self._normalize(joined, self.case_sensitive)), None) is not None
+
+    def select_matches(self, text: str) -> List[Tuple[int, int, int]]:
+        """
+        在一段已归一化的文本中找出最终采用的命中，按选项过滤整词并消解重叠
+
+        Returns:
+            [(起始下标, 结束下标, 规则序号), ...]
+        """
+        matches = self.iter_matches(text)
+        if self.whole_word:
+            is_word = self._is_word_char
+            matches = [(start, end, index) for start, end, index in matches
+                       if not (start > 0 and is_word(text[start - 1]) and is_word(text[start]))
+                       and not (end < len(text) and is_word(text[end]) and is_word(text[end - 1]))]
+
+        selected = []
+        if self.longest:
+            # 最左最长：按起点排序、同起点时长者优先，依次取与已选命中不重叠的
+            last_end = 0
+            for start, end, index in sorted(matches, key=lambda m: (m[0], m[0] - m[1])):
+                if start >= last_end:
+                    selected.append((start, end, index))
+                    last_end = end
         else:
-            self.rules = self._load_rules_from_file(rules_source)
-            logger.info(f"从文件 {rules_source} 加载了 {len(self.rules)} 条替换规则")
+            last_ends: Dict[int, int] = {}
+            for start, end, index in matches:
+                if start < last_ends.get(index, 0):
+                    continue
+                last_ends[index] = end
+                selected.append((start, end, index))
+        return selected
 
-        # 定义并创建字体目录
-        self.fonts_dir = "fonts"
-        if not os.path.exists(self.fonts_dir):
-            os.makedirs(self.fonts_dir)
-            logger.info(f"创建字体目录: {self.fonts_dir}")
+    def find_overlaps(self) -> List[Tuple[str, str]]:
+        """
+        找出原文本互相包含的规则对，用于加载规则时提示冲突
+
+        Returns:
+            [(较短的原文本, 包含它的较长原文本), ...]
+        """
+        overlaps = []
+        for index, pattern in enumerate(self.patterns):
+            key = self._normalize(pattern, self.case_sensitive)
+            for other in {other for _, _, other in self.iter_matches(key) if other != index}:
+                overlaps.append((self.patterns[other], pattern))
+        return overlaps
 
-    def _load_rules_from_file(self, rules_file: str) -> Dict[str, str]:
+    def search_page(self, page_dict: dict) -> Dict[str, List[fitz.Rect]]:
         """
-        从文件加载替换规则
+        在一页的 rawdict 文本中查找所有规则
 
         Args:
-            rules_file: 规则文件路径
+            page_dict: page.get_text("rawdict") 的结果，每页只需提取一次
 
         Returns:
-            替换规则字典 {原文本: 替换文本}
+            {原文本: [命中矩形, ...]}，矩形顺序与页面阅读顺序一致；
+            跨行的命中与 search_for 一样按行拆成多个矩形
         """
-        rules = {}
-        try:
-            with open(rules_file, 'r', encoding='utf-8') as f:
-                for line_num, line in enumerate(f, 1):
-                    line = line.strip()
-                    if not line or line.startswith('#'):
-                        continue
-                    parts = line.split('|')
-                    if len(parts) != 2:
-                        logger.warning(f"第 {line_num} 行格式错误，跳过: {line}")
+        return {pattern: [rect for parts in matches for rect in parts]
+                for pattern, matches in self.search_page_matches(page_dict).items()}
+
+    def search_page_matches(self, page_dict: dict) -> Dict[str, List[List[fitz.Rect]]]:
+        """
+        在一页的 rawdict 文本中查找所有规则，保留每处命中的各行部分
+
+        整页文本按阅读顺序连成一串，行与行之间视为一个空格，因此折行的短语也能命中；
+        行尾的连字符后接下一行的单词时视为断词，去掉连字符直接相连（如 "Proj-" / "ect"）。
+
+        Returns:
+            {原文本: [[第一行部分的矩形, 后续各行部分的矩形, ...], ...]}
+        """
+        hits: Dict[int, List[List[fitz.Rect]]] = {}
+        if not self.patterns:
+            return {}
+
+        fold = self._fold_space if self.case_sensitive else self._fold
+        is_word = self._is_word_char
+        # 逐字符归一化，连续空白只保留第一个字符；行间插入的空格没有矩形
+        chars: List[str] = []
+        boxes: List[Tuple[float, float, float, float] | None] = []
+        line_ids: List[int] = []
+        line_id = 0
+        for block in page_dict["blocks"]:
+            if block["type"] != 0:
+                continue
+            for line in block["lines"]:
+                line_chars = [char for span in line["spans"] for char in span["chars"]]
+                if not line_chars:
+                    continue
+                line_id += 1
+                if chars:
+                    first = fold(line_chars[0]["c"])
+                    if (chars[-1] == "-" and len(chars) > 1 and is_word(chars[-2]) and is_word(first)
+                            and line_ids[-2] == line_ids[-1]):
+                        # 断词：连字符并入前一个字符的矩形，擦除时一起去掉
+                        chars.pop()
+                        hyphen = boxes.pop()
+                        line_ids.pop()
+                        prev = boxes[-1]
+                        boxes[-1] = (min(prev[0], hyphen[0]), min(prev[1], hyphen[1]),
+                                     max(prev[2], hyphen[2]), max(prev[3], hyphen[3]))
+                    elif chars[-1] != " ":
+                        chars.append(" ")
+                        boxes.append(None)
+                        line_ids.append(0)
+                for char in line_chars:
+                    ch = fold(char["c"])
+                    if ch == " " and chars and chars[-1] == " ":
                         continue
-                    rules[parts[0].strip()] = parts[1].strip()
-        except Exception as e:
-            logger.error(f"读取规则文件失败: {e}")
-            raise
-        return rules
+                    chars.append(ch)
+                    boxes.append(char["bbox"])
+                    line_ids.append(line_id)
+        if not chars:
+            return {}
+
+        for start, end, index in self.select_matches("".join(chars)):
+            parts: Dict[int, List[Tuple[float, float, float, float]]] = {}
+            for pos in range(start, end):
+                if boxes[pos] is not None:
+                    parts.setdefault(line_ids[pos], []).append(boxes[pos])
+            rects = [fitz.Rect(min(b[0] for b in part), min(b[1] for b in part),
+                               max(b[2] for b in part), max(b[3] for b in part)) for part in parts.values()]
+            if rects:
+                hits.setdefault(index, []).append(rects)
+        # 按规则顺序返回，与逐条规则调用 search_for 时的处理顺序一致
+        return {self.patterns[index]: hits[index] for index in sorted(hits)}
+
+
+def _file_digest(path: str) -> str:
+    """分块计算文件内容的 sha256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _pages_key(pages: List[int] | None) -> str:
+    """页面子集在缓存键中的表示，None 表示全部页面"""
+    return "*" if pages is None else ",".join(map(str, pages))
+
+
+# 编译后规则集的缓存目录，按规则文件内容哈希和匹配选项区分
+RULES_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pdf_replacer", "rules")
+
+
+class RuleSet:
+    """
+    编译后的替换规则集：去重后的规则字典加上构建好的多模式匹配器
+
+    原文本互相重叠时按最左最长匹配处理；从文件加载时逐行流式解析，
+    编译结果按文件内容哈希缓存为二进制文件，再次加载同一规则文件时直接读取缓存。
+    """
+
+    # 缓存格式版本，RuleSet 或 _RuleMatcher 的结构变化时递增
+    CACHE_VERSION = 3
+
+    def __init__(self, rules: Dict[str, str] | Iterable[Tuple[str, str]], case_sensitive: bool = False,
+                 whole_word: bool = False):
+        """
+        Args:
+            rules: 规则字典，或 (原文本, 替换文本) 序列
+            case_sensitive: 区分大小写
+            whole_word: 只匹配完整单词
+        """
+        self.case_sensitive = case_sensitive
+        self.whole_word = whole_word
+        self.rules: Dict[str, str] = {}
+        self.duplicates = 0
+
+        # 归一化后相同的原文本视为同一条规则，后出现的覆盖先出现的
+        keys: Dict[str, str] = {}
+        for old_text, new_text in (rules.items() if isinstance(rules, dict) else rules):
+            key = _RuleMatcher._normalize(old_text, case_sensitive)
+            previous = keys.get(key)
+            if previous is not None:
+                self.duplicates += 1
+                del self.rules[previous]
+            keys[key] = old_text
+            self.rules[old_text] = new_text
+
+        self.matcher = _RuleMatcher(self.rules, case_sensitive=case_sensitive, whole_word=whole_word,
+                                    longest=True)
+        self.overlaps = self.matcher.find_overlaps()
+        # 去重后的规则和匹配选项的哈希，内容相同的规则集无论来源都得到相同的值
+        self.fingerprint = hashlib.sha256(json.dumps(
+            [case_sensitive, whole_word, sorted(self.rules.items())], ensure_ascii=False).encode()).hexdigest()
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def log_summary(self, source: str):
+        logger.info(f"从{source}加载了 {len(self.rules)} 条替换规则")
+        if self.duplicates:
+            logger.warning(f"{self.duplicates} 条规则的原文本重复，已保留最后出现的一条")
+        if self.overlaps:
+            examples = ", ".join(f"'{short}' ⊂ '{long}'" for short, long in self.overlaps[:5])
+            logger.info(f"{len(self.overlaps)} 组规则原文本互相包含，按最长匹配优先处理: {examples}")
+
+    @staticmethod
+    def iter_file(rules_file: str) -> Iterator[Tuple[str, str]]:
+        """逐行读取规则文件，产出 (原文本, 替换文本)；空行和 # 开头的注释被忽略"""
+        with open(rules_file, 'r', encoding='utf-8') as f:
+            for line_num, line in enumerate(f, 1):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                parts = line.split('|')
+                if len(parts) != 2:
+                    logger.warning(f"第 {line_num} 行格式错误，跳过: {line}")
+                    continue
+                yield parts[0].strip(), parts[1].strip()
+
+    @classmethod
+    def from_file(cls, rules_file: str, case_sensitive: bool = False, whole_word: bool = False,
+                  cache_dir: str | None = RULES_CACHE_DIR) -> "RuleSet":
+        """
+        从文件加载并编译规则集
+
+        Args:
+            rules_file: 规则文件路径，每行 "原文本|替换文本"
+            case_sensitive: 区分大小写
+            whole_word: 只匹配完整单词
+            cache_dir: 编译结果缓存目录，None 表示不使用缓存
+
+        Returns:
+            编译后的规则集
+        """
+        cache_path = None
+        if cache_dir:
+            digest = hashlib.sha256(f"{cls.CACHE_VERSION}|{case_sensitive}|{whole_word}|".encode())
+            with open(rules_file, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+            cache_path = os.path.join(cache_dir, f"{digest.hexdigest()}.pickle")
+            if os.path.exists(cache_path):
+                try:
+                    with open(cache_path, 'rb') as f:
+                        return cls._from_state(pickle.load(f))
+                except Exception as e:
+                    logger.warning(f"规则缓存无法读取，重新编译: {e}")
+
+        ruleset = cls(cls.iter_file(rules_file), case_sensitive=case_sensitive, whole_word=whole_word)
+        if cache_path:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                # 先写临时文件再原子替换，并发加载同一规则文件时不会读到不完整的缓存
+                fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+                with os.fdopen(fd, 'wb') as f:
+                    pickle.dump(ruleset._to_state(), f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, cache_path)
+            except OSError as e:
+                logger.warning(f"规则缓存写入失败: {e}")
+        return ruleset
+
+    def _to_state(self) -> dict:
+        """
+        导出为只含内置类型的状态，用于缓存文件
+
+        不直接序列化对象本身：以脚本方式运行时类属于 __main__ 模块，
+        这样的缓存在作为模块导入时无法读取。
+        """
+        state = {name: value for name, value in vars(self).items() if name != "matcher"}
+        return {"ruleset": state, "matcher": vars(self.matcher)}
+
+    @classmethod
+    def _from_state(cls, state: dict) -> "RuleSet":
+        ruleset = cls.__new__(cls)
+        vars(ruleset).update(state["ruleset"])
+        ruleset.matcher = _RuleMatcher.__new__(_RuleMatcher)
+        vars(ruleset.matcher).update(state["matcher"])
+        return ruleset
+
+
+def _int_to_rgb(color: int) -> Tuple[float, float, float]:
+    """将 span 中的 sRGB 整数颜色转换为 (r, g, b) 浮点元组"""
+    return ((color >> 16) & 0xFF) / 255.0, ((color >> 8) & 0xFF) / 255.0, (color & 0xFF) / 255.0
+
+
+class _SpanIndex:
+    """
+    页面文本片段(span)的网格空间索引：每页只提取一次 rawdict，
+    之后每个命中矩形都通过网格快速找到与之相交的 span 并读取字体样式。
+    """
+
+    def __init__(self, page_dict: dict, cell_size: float = 50.0):
+        self.cell_size = cell_size
+        self.spans: List[dict] = []
+        self._grid: Dict[Tuple[int, int], List[int]] = {}
+
+        for block in page_dict["blocks"]:
+            if block["type"] != 0:
+                continue
+            for line in block["lines"]:
+                for span in line["spans"]:
+                    index = len(self.spans)
+                    self.spans.append(span)
+                    for cell in self._cells(fitz.Rect(span["bbox"])):
+                        self._grid.setdefault(cell, []).append(index)
+
+    def _cells(self, rect: fitz.Rect) -> Iterator[Tuple[int, int]]:
+        size = self.cell_size
+        for gx in range(int(rect.x0 // size), int(rect.x1 // size) + 1):
+            for gy in range(int(rect.y0 // size), int(rect.y1 // size) + 1):
+                yield gx, gy
+
+    def query(self, rect: fitz.Rect) -> List[dict]:
+        """返回与矩形相交的所有 span，保持页面阅读顺序"""
+        found = set()
+        for cell in self._cells(rect):
+            found.update(self._grid.get(cell, ()))
+        return [self.spans[i] for i in sorted(found) if rect.intersects(self.spans[i]["bbox"])]
+
+    def lookup_style(self, rect: fitz.Rect, old_text: str) -> dict:
+        """
+        查找命中矩形处原文本的字体、字号、颜色和基线
+
+        优先选择矩形内文字包含原文本的 span；若原文本跨越多个 span，
+        则取与矩形重叠面积最大的 span；都没有时使用默认样式。
+        """
+        style = {'fontname': 'helv', 'fontsize': 12, 'color': (0, 0, 0), 'baseline': rect.y1}
+        candidates = self.query(rect)
+        if not candidates:
+            return style
+
+        key = _RuleMatcher._normalize(old_text)
+        x0, y0, x1, y1 = rect
+        chosen = None
+        for span in candidates:
+            # 只取字符中心落在命中矩形内的文字，等价于原先的 get_text(clip=rect)
+            clipped = "".join(c["c"] for c in span["chars"]
+                              if x0 <= (c["bbox"][0] + c["bbox"][2]) / 2 <= x1
+                              and y0 <= (c["bbox"][1] + c["bbox"][3]) / 2 <= y1)
+            if key in _RuleMatcher._normalize(clipped):
+                chosen = span
+                break
+        if chosen is None:
+            chosen = max(candidates, key=lambda sp: (fitz.Rect(sp["bbox"]) & rect).get_area())
+
+        style['fontname'] = chosen.get("font", "helv").split("+")[-1]
+        style['fontsize'] = chosen.get("size", 12)
+        style['baseline'] = chosen.get("origin")[1]  # 获取精确基线Y坐标
+        color = chosen.get("color", 0)
+        if isinstance(color, int):
+            style['color'] = _int_to_rgb(color)
+        return style
+
+
+class FontRegistry:
+    """
+    本地字体注册表：构造时扫描一次字体目录，字体名查找结果会被缓存。
+
+    配合 embed() 使用时，每个字体在同一文档中只嵌入一次，
+    其余页面直接在资源字典中引用同一个字体对象(xref)。
+    """
+
+    FONT_EXTENSIONS = ('.ttf', '.otf', '.ttc')
+
+    def __init__(self, fonts_dir: str):
+        self.fonts_dir = fonts_dir
+        self._files: List[Tuple[str, str]] = []
+        self._lookup_cache: Dict[str, str | None] = {}
+        self._buffers: Dict[str, bytes] = {}
+
+        if os.path.isdir(fonts_dir):
+            names = sorted(os.listdir(fonts_dir))
+            # 按扩展名优先级排列，与原先逐个扩展名查找的顺序保持一致
+            for ext in self.FONT_EXTENSIONS:
+                for f in names:
+                    if f.lower().endswith(ext):
+                        self._files.append((f.lower(), os.path.join(fonts_dir, f)))
+        logger.debug(f"字体目录 {fonts_dir} 中共索引 {len(self._files)} 个字体文件")
+
+    def find(self, font_name: str) -> str | None:
+        """按字体名查找字体文件：优先完全匹配文件名，其次匹配文件名前缀"""
+        key = font_name.lower()
+        if key not in self._lookup_cache:
+            path = None
+            for lower_name, file_path in self._files:
+                if os.path.splitext(lower_name)[0] == key:
+                    path = file_path
+                    break
+            if path is None:
+                for lower_name, file_path in self._files:
+                    if lower_name.startswith(key):
+                        path = file_path
+                        break
+            self._lookup_cache[key] = path
+        return self._lookup_cache[key]
+
+    def fingerprint(self) -> str:
+        """已索引字体文件的名称、大小和修改时间的哈希，字体增删或更新后随之变化"""
+        digest = hashlib.sha256()
+        for lower_name, file_path in self._files:
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            digest.update(f"{lower_name}|{stat.st_size}|{stat.st_mtime_ns}\n".encode())
+        return digest.hexdigest()
 
-    def replace_pdf(self, input_pdf: str, output_pdf: str, method: str = 'precise'):
+    def _font_buffer(self, font_path: str) -> bytes:
+        if font_path not in self._buffers:
+            with open(font_path, 'rb') as f:
+                self._buffers[font_path] = f.read()
+        return self._buffers[font_path]
+
+    def embed(self, page: fitz.Page, fontname: str, font_path: str, embedded: Dict[str, int]) -> int:
+        """
+        将字体注册到页面，同一文档中每个字体只嵌入一次
+
+        Args:
+            page: 目标页面
+            fontname: 页面资源中使用的字体名
+            font_path: 字体文件路径
+            embedded: 当前文档已嵌入字体的 {字体名: xref} 表，由调用方按文档维护
+
+        Returns:
+            字体对象的 xref
+        """
+        doc = page.parent
+        xref = embedded.get(fontname)
+        if xref is None:
+            xref = page.insert_font(fontname=fontname, fontbuffer=self._font_buffer(font_path))
+            embedded[fontname] = xref
+            return xref
+
+        target = self._font_resource_target(doc, page)
+        if target is None:
+            # 资源字典结构特殊时退回到常规注册方式
+            return page.insert_font(fontname=fontname, fontbuffer=self._font_buffer(font_path))
+        owner, prefix = target
+        if doc.xref_get_key(owner, prefix + fontname)[0] == "null":
+            doc.xref_set_key(owner, prefix + fontname, f"{xref} 0 R")
+        return xref
+
+    @staticmethod
+    def _font_resource_target(doc: fitz.Document, page: fitz.Page) -> Tuple[int, str] | None:
+        """定位页面 /Resources/Font 字典所在的对象及键路径（路径中不能包含间接引用）"""
+        kind, value = doc.xref_get_key(page.xref, "Resources")
+        if kind == "xref":
+            owner, prefix = int(value.split()[0]), ""
+        elif kind == "dict":
+            owner, prefix = page.xref, "Resources/"
+        else:
+            return None
+
+        kind, value = doc.xref_get_key(owner, prefix + "Font")
+        if kind == "xref":
+            return int(value.split()[0]), ""
+        if kind in ("dict", "null"):
+            return owner, prefix + "Font/"
+        return None
+
+
+class ReplacementCancelled(Exception):
+    """替换过程被 cancel_event 取消"""
+
+
+def peak_rss_mb() -> float | None:
+    """进程启动以来的峰值常驻内存(MB)；无法获取时返回 None"""
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return maxrss / (1 << 20) if sys.platform == "darwin" else maxrss / 1024
+
+
+def current_rss_mb() -> float | None:
+    """当前进程的常驻内存(MB)；无法获取时返回 None"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1 << 20)
+    except (OSError, ValueError, AttributeError):
+        # 非 Linux 系统上退而使用峰值内存
+        return peak_rss_mb()
+
+
+class ReplacementMetrics:
+    """
+    替换流程的分阶段计时与计数，按文档汇总并保留逐页明细
+
+    阶段: open, extract(纯文本预筛选), search(rawdict与多模式匹配), style(样式查找),
+         redact, verify_page(hybrid残留检查), overlay, insert, font_embed, save
+    峰值: rss_mb（各采样点中常驻内存的最大值）
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, float] = defaultdict(float)
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.peaks: Dict[str, float] = {}
+        self.pages: Dict[int, Dict[str, float]] = {}
+
+    @contextmanager
+    def stage(self, name: str, page_num: int | None = None):
+        """计时上下文；指定页码时同时记入该页的明细（页码从0开始）"""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start_time
+            self.stages[name] += elapsed
+            if page_num is not None:
+                page = self.pages.setdefault(page_num, {})
+                page[name] = page.get(name, 0.0) + elapsed
+
+    def count(self, name: str, value: int = 1, page_num: int | None = None):
+        self.counters[name] += value
+        if page_num is not None:
+            page = self.pages.setdefault(page_num, {})
+            page[name] = page.get(name, 0) + value
+
+    def peak(self, name: str, value: float | None):
+        """记录峰值类指标，只保留最大值"""
+        if value is not None:
+            self.peaks[name] = max(self.peaks.get(name, value), value)
+
+    def merge(self, other: dict):
+        """合并另一份 to_dict() 结果（例如并行模式下各工作进程的统计）"""
+        for name, value in other["stages"].items():
+            self.stages[name] += value
+        for name, value in other["counters"].items():
+            self.counters[name] += value
+        for name, value in other.get("peaks", {}).items():
+            self.peak(name, value)
+        for page_num, values in other["pages"].items():
+            page = self.pages.setdefault(int(page_num) - 1, {})
+            for name, value in values.items():
+                page[name] = page.get(name, 0) + value
+
+    def to_dict(self) -> dict:
+        """导出为可JSON序列化的字典，逐页明细中的页码从1开始"""
+        return {
+            "stages": {name: round(value, 6) for name, value in self.stages.items()},
+            "counters": dict(self.counters),
+            "peaks": {name: round(value, 1) for name, value in self.peaks.items()},
+            "pages": {str(page_num + 1): {name: round(value, 6) if isinstance(value, float) else value
+                                          for name, value in values.items()}
+                      for page_num, values in sorted(self.pages.items())},
+        }
+
+
+# 替换结果缓存的默认目录和容量上限
+RESULTS_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pdf_replacer", "results")
+RESULTS_CACHE_MAX_MB = 2048
+
+
+class ResultCache:
+    """
+    按内容哈希缓存替换结果，未变化的文档再次处理时直接复制已保存的输出，不打开PDF
+
+    缓存键由输入文件内容、规则集、字体目录、替换方法、保存配置和工具版本共同决定；
+    每条缓存是 <键>.pdf 和记录替换次数的 <键>.json。命中时更新修改时间，
+    总大小超过上限时按修改时间从旧到新淘汰（LRU）。多个进程可以共用同一缓存目录。
+
+    总大小在创建时扫描一次，之后每次写入累加，只有估计值超过上限时才重新扫描目录并淘汰；
+    其他进程写入的条目在下一次扫描时计入。
+    """
+
+    def __init__(self, cache_dir: str = RESULTS_CACHE_DIR, max_mb: float = RESULTS_CACHE_MAX_MB):
+        """
+        Args:
+            cache_dir: 缓存目录
+            max_mb: 缓存总大小上限(MB)
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        os.makedirs(cache_dir, exist_ok=True)
+        self._total = sum(size for _, size, _ in self._entries())
+
+    def key(self, input_pdf: str, ruleset: RuleSet, font_registry: FontRegistry, method: str,
+            save_profile: str, pages: List[int] | None = None) -> str:
+        """计算缓存键"""
+        parts = [_file_digest(input_pdf), ruleset.fingerprint, font_registry.fingerprint(), method,
+                 save_profile, __version__, fitz.VersionBind, _pages_key(pages)]
+        return hashlib.sha256("|".join(parts).encode()).hexdigest()
+
+    def _paths(self, key: str) -> Tuple[str, str]:
+        base = os.path.join(self.cache_dir, key)
+        return f"{base}.pdf", f"{base}.json"
+
+    def fetch(self, key: str, output_pdf: str) -> int | None:
+        """
+        查找缓存，命中时将缓存的输出复制到 output_pdf
+
+        Returns:
+            缓存的替换次数，未命中返回 None
+        """
+        pdf_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                replacements = json.load(f)["replacements"]
+            shutil.copyfile(pdf_path, output_pdf)
+            now = time.time()
+            os.utime(pdf_path, (now, now))
+            os.utime(meta_path, (now, now))
+        except (OSError, ValueError, KeyError):
+            # 条目不存在、不完整或刚被其他进程淘汰，都按未命中处理
+            return None
+        return replacements
+
+    def store(self, key: str, output_pdf: str, replacements: int):
+        """保存一次替换结果，随后按容量上限淘汰最久未使用的条目"""
+        pdf_path, meta_path = self._paths(key)
+        try:
+            # 先写临时文件再原子替换；元数据最后写入，它存在即表示条目完整
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            os.close(fd)
+            shutil.copyfile(output_pdf, tmp_path)
+            size = os.path.getsize(tmp_path)
+            if os.path.exists(pdf_path):
+                size -= os.path.getsize(pdf_path)
+            os.replace(tmp_path, pdf_path)
+            self._total += size
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({"replacements": replacements}, f)
+            os.replace(tmp_path, meta_path)
+        except OSError as e:
+            logger.warning(f"结果缓存写入失败: {e}")
+            return
+        if self._total > self.max_bytes:
+            self.evict()
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        """扫描缓存目录，返回每个条目的 (修改时间, 大小, PDF路径)"""
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(".pdf"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self):
+        """重新扫描缓存目录，总大小超过上限时按最近使用时间从旧到新删除条目"""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        self._total = total
+        if total <= self.max_bytes:
+            return
+
+        entries.sort()
+        removed = 0
+        for _, size, pdf_path in entries:
+            if total <= self.max_bytes:
+                break
+            for path in (os.path.splitext(pdf_path)[0] + ".json", pdf_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+            removed += 1
+        self._total = total
+        logger.info(f"结果缓存超过 {self.max_bytes / 1024 / 1024:.0f} MB，淘汰了 {removed} 个最久未使用的条目")
+
+
+class PyMuPDFTextReplacer:
+    """使用PyMuPDF的文本替换器"""
+
+    def __init__(self, rules_source: str | Dict[str, str] | RuleSet, fonts_dir: str = "fonts",
+                 font_registry: FontRegistry | None = None):
+        """
+        初始化替换器
+
+        Args:
+            rules_source: 替换规则，可以是文件路径(str)、规则字典(dict)或已编译的规则集(RuleSet)
+            fonts_dir: 本地字体目录
+            font_registry: 可选，复用已构建的字体注册表（此时忽略 fonts_dir）
+        """
+        if isinstance(rules_source, RuleSet):
+            self.ruleset = rules_source
+        elif isinstance(rules_source, dict):
+            self.ruleset = RuleSet(rules_source)
+            self.ruleset.log_summary("字典")
+        else:
+            try:
+                self.ruleset = RuleSet.from_file(rules_source)
+            except Exception as e:
+                logger.error(f"读取规则文件失败: {e}")
+                raise
+            self.ruleset.log_summary(f"文件 {rules_source} ")
+        self.rules = self.ruleset.rules
+
+        # 多模式匹配器只需构建一次，所有页面共用
+        self.matcher = self.ruleset.matcher
+        # 最近一次运行的分阶段统计，每次调用 replace_pdf / replace_stream 时重置
+        self.metrics = ReplacementMetrics()
+        # 当前运行的逐页进度回调和取消事件，由 replace_pdf / replace_stream 设置
+        self.progress_callback: Callable[[dict], None] | None = None
+        self.cancel_event = None
+        # incremental 保存时由输入复制出的输出文件，处理完成前出错则删除
+        self._incremental_copy: str | None = None
+
+        if font_registry is None:
+            # 定义并创建字体目录
+            self.fonts_dir = fonts_dir
+            if not os.path.exists(self.fonts_dir):
+                os.makedirs(self.fonts_dir)
+                logger.info(f"创建字体目录: {self.fonts_dir}")
+            # 字体目录只扫描一次，查找结果缓存在注册表中
+            font_registry = FontRegistry(self.fonts_dir)
+        else:
+            # 长期运行的进程中多个替换器共享同一个字体注册表
+            self.fonts_dir = font_registry.fonts_dir
+        self.font_registry = font_registry
+
+    def replace_pdf(self, input_pdf: str, output_pdf: str, method: str = 'precise', workers: int = 1,
+                    save_profile: str | None = None, metrics_callback: Callable[[dict], None] | None = None,
+                    stream: bool = False, window: int = 50, max_memory_mb: float | None = None,
+                    progress_callback: Callable[[dict], None] | None = None, cancel_event=None,
+                    result_cache: ResultCache | None = None, checkpoint_dir: str | None = None,
+                    pages: Iterable[int] | None = None):
         """
         执行PDF文本替换
 
@@ -80,244 +885,956 @@ class PyMuPDFTextReplacer:
             input_pdf: 输入PDF文件路径
             output_pdf: 输出PDF文件路径
             method: 替换方法 ('precise', 'overlay', 'hybrid')
+            workers: 并行处理的进程数，大于1时按页范围拆分到多个进程处理
+            save_profile: 保存配置 ('fast', 'balanced', 'compact', 'incremental')；默认流式处理（含检查点模式）
+                          时为 incremental，其他情况为 compact
+            metrics_callback: 可选，处理完成后以分阶段统计字典调用（见 ReplacementMetrics）
+            stream: 流式处理，按窗口逐段处理并写出页面，内存占用与文档页数无关；
+                    只有 incremental 保存配置的收尾保存也不随页数增长，其他配置需要重写整个文档
+            window: 流式处理时每个窗口的页数
+            max_memory_mb: 流式处理时的内存上限(MB)，超出时缩小窗口，窗口为1页仍超出则中止
+            progress_callback: 可选，每处理完一页以 {"page", "pages", "replacements"} 调用一次
+                               （多进程并行模式下不逐页回调）
+            cancel_event: 可选，带 is_set() 方法的事件（如 threading.Event），置位后在下一页开始前
+                          抛出 ReplacementCancelled，不会写出输出文件
+            result_cache: 可选，结果缓存；输入、规则和选项都未变化时直接复制缓存的输出，
+                          命中与否记入统计计数 result_cache_hits / result_cache_misses
+            checkpoint_dir: 可选，检查点目录；按流式窗口处理，每个窗口写出后记录检查点，
+                            同一文档、规则和方法再次运行时从最后一个检查点继续，成功完成后删除检查点
+            pages: 可选，只查找和替换这些页（从0开始，例如由语料索引筛选出的页面），其余页面原样保留
+
+        Returns:
+            替换次数
         """
         start_time = time.time()
+        self.metrics = ReplacementMetrics()
+        self.progress_callback, self.cancel_event = progress_callback, cancel_event
+        self._incremental_copy = None
+        if method not in ('precise', 'overlay', 'hybrid'):
+            raise ValueError(f"未知的替换方法: {method}")
+        if save_profile is None:
+            save_profile = 'incremental' if stream or checkpoint_dir else 'compact'
+        if save_profile not in SAVE_PROFILES:
+            raise ValueError(f"未知的保存配置: {save_profile}")
+        if (stream or checkpoint_dir) and workers > 1:
+            raise ValueError("流式处理（含检查点模式）与多进程并行不能同时使用")
         try:
-            if method == 'precise':
-                total_replacements = self._precise_replace_fixed(input_pdf, output_pdf)
-            elif method == 'overlay':
-                total_replacements = self._overlay_replace(input_pdf, output_pdf)
-            elif method == 'hybrid':
-                total_replacements = self._hybrid_replace(input_pdf, output_pdf)
+            if pages is not None:
+                pages = sorted(set(pages))
+                if workers > 1:
+                    logger.info(f"只处理 {len(pages)} 个指定页面，不使用多进程并行")
+                    workers = 1
+
+            cache_key = None
+            if result_cache is not None:
+                with self.metrics.stage("cache_lookup"):
+                    cache_key = result_cache.key(input_pdf, self.ruleset, self.font_registry, method, save_profile,
+                                                 pages)
+                    cached = result_cache.fetch(cache_key, output_pdf)
+                if cached is not None:
+                    self.metrics.count("result_cache_hits")
+                    elapsed_time = time.time() - start_time
+                    logger.info(f"结果缓存命中，跳过处理: {input_pdf}")
+                    logger.info(f"总计替换: {cached} 处（缓存）")
+                    logger.info(f"输出文件: {output_pdf}")
+                    self._report_metrics(metrics_callback, input_pdf, output_pdf, method, elapsed_time)
+                    return cached
+                self.metrics.count("result_cache_misses")
+                logger.info("结果缓存未命中，处理完成后写入缓存")
+
+            if stream or checkpoint_dir:
+                total_replacements = self._streaming_replace(input_pdf, output_pdf, method, save_profile,
+                                                             window, max_memory_mb, checkpoint_dir, pages)
+            elif workers > 1:
+                total_replacements = self._parallel_replace(input_pdf, output_pdf, method, workers, save_profile)
             else:
-                logger.error(f"未知的替换方法: {method}")
-                return
+                total_replacements = self._run_method(input_pdf, output_pdf, method, save_profile, pages)
+            self._incremental_copy = None
+            if cache_key is not None:
+                with self.metrics.stage("cache_store"):
+                    result_cache.store(cache_key, output_pdf, total_replacements)
 
             elapsed_time = time.time() - start_time
             logger.info(f"处理完成！")
             logger.info(f"总计替换: {total_replacements} 处")
             logger.info(f"耗时: {elapsed_time:.2f} 秒")
             logger.info(f"输出文件: {output_pdf}")
+            self._report_metrics(metrics_callback, input_pdf, output_pdf, method, elapsed_time)
+            return total_replacements
 
+        except ReplacementCancelled as e:
+            logger.warning(f"已取消: {e}")
+            self._discard_incremental_copy()
+            raise
         except Exception as e:
             logger.error(f"处理PDF时出错: {e}")
+            self._discard_incremental_copy()
             raise
 
+    def _discard_incremental_copy(self):
+        """增量保存会先把输入复制为输出文件，处理未完成时删除这份未处理（或只保存了一半）的副本"""
+        if self._incremental_copy and os.path.exists(self._incremental_copy):
+            os.remove(self._incremental_copy)
+        self._incremental_copy = None
+
+    def replace_stream(self, input_stream: BinaryIO | bytes, output_stream: BinaryIO, method: str = 'precise',
+                       save_profile: str = 'compact', metrics_callback: Callable[[dict], None] | None = None,
+                       progress_callback: Callable[[dict], None] | None = None, cancel_event=None) -> int:
+        """
+        在内存中执行PDF文本替换，不经过临时文件或文件复制
+
+        Args:
+            input_stream: 输入PDF的字节内容，或可读取的文件对象
+            output_stream: 可写入且支持 tell() 的文件对象，输出PDF写入其当前位置
+            method: 替换方法 ('precise', 'overlay', 'hybrid')
+            save_profile: 保存配置 ('fast', 'balanced', 'compact')；增量保存需要原文件，
+                          内存模式下会改用 balanced
+            metrics_callback: 可选，处理完成后以分阶段统计字典调用
+            progress_callback: 可选，每处理完一页调用一次（见 replace_pdf）
+            cancel_event: 可选，置位后在下一页开始前抛出 ReplacementCancelled
+
+        Returns:
+            替换次数
+        """
+        if method not in ('precise', 'overlay', 'hybrid'):
+            raise ValueError(f"未知的替换方法: {method}")
+        if save_profile not in SAVE_PROFILES:
+            raise ValueError(f"未知的保存配置: {save_profile}")
+        if save_profile == 'incremental':
+            logger.warning("内存模式不支持增量保存，改用 balanced 保存配置")
+            save_profile = 'balanced'
+
+        start_time = time.time()
+        self.metrics = ReplacementMetrics()
+        self.progress_callback, self.cancel_event = progress_callback, cancel_event
+        data = input_stream if isinstance(input_stream, (bytes, bytearray, memoryview)) else input_stream.read()
+        with self.metrics.stage("open"):
+            doc = fitz.open(stream=data, filetype="pdf")
+        try:
+            total_replacements = self._replace_doc(doc, method)
+            self._save_document(doc, output_stream, save_profile)
+        finally:
+            doc.close()
+
+        elapsed_time = time.time() - start_time
+        logger.info(f"处理完成！总计替换: {total_replacements} 处，耗时: {elapsed_time:.2f} 秒")
+        self._report_metrics(metrics_callback, None, None, method, elapsed_time)
+        return total_replacements
+
+    def _report_metrics(self, metrics_callback: Callable[[dict], None] | None, input_pdf: str | None,
+                        output_pdf: str | None, method: str, elapsed_time: float):
+        """记录各阶段耗时摘要，并将完整统计交给回调"""
+        stages = sorted(self.metrics.stages.items(), key=lambda item: item[1], reverse=True)
+        logger.debug("各阶段耗时: " + ", ".join(f"{name} {value:.3f}s" for name, value in stages))
+        if metrics_callback:
+            metrics_callback({"input": input_pdf, "output": output_pdf, "method": method,
+                              "elapsed": round(elapsed_time, 6), **self.metrics.to_dict()})
+
+    def replace_bytes(self, pdf_bytes: bytes, method: str = 'precise', save_profile: str = 'compact') -> bytes:
+        """
+        在内存中执行PDF文本替换，直接返回输出PDF的字节内容
+
+        Args:
+            pdf_bytes: 输入PDF的字节内容
+            method: 替换方法 ('precise', 'overlay', 'hybrid')
+            save_profile: 保存配置，见 replace_stream
+
+        Returns:
+            输出PDF的字节内容
+        """
+        output = io.BytesIO()
+        self.replace_stream(pdf_bytes, output, method=method, save_profile=save_profile)
+        return output.getvalue()
+
+    def scan(self, pdf: str | fitz.Document, pages: Iterable[int] | None = None) -> dict:
+        """
+        只扫描不替换：统计每条规则在各页的命中次数和位置
+
+        与替换使用相同的预筛选和匹配逻辑，但不读取样式、不擦除、不写入，也不保存。
+
+        Args:
+            pdf: PDF文件路径，或已打开的文档
+            pages: 可选，只扫描这些页（从0开始）
+
+        Returns:
+            扫描报告，只列出有命中的规则；页码从1开始，位置为 [x0, y0, x1, y1]
+        """
+        start_time = time.time()
+        self.metrics = ReplacementMetrics()
+        doc = fitz.open(pdf) if isinstance(pdf, str) else pdf
+        try:
+            page_count = len(doc)
+            page_hits: Dict[int, Dict[str, List[fitz.Rect]]] = {}
+            for page_num in (range(page_count) if pages is None else sorted(set(pages))):
+                page = doc[page_num]
+                self.metrics.count("pages")
+                with self.metrics.stage("extract", page_num):
+                    textpage = page.get_textpage()
+                    possible = self.matcher.has_match(page.get_text("text", textpage=textpage))
+                if not possible:
+                    continue
+                with self.metrics.stage("search", page_num):
+                    hits = self.matcher.search_page(page.get_text("rawdict", textpage=textpage))
+                if hits:
+                    page_hits[page_num + 1] = hits
+                    self.metrics.count("hits", sum(len(rects) for rects in hits.values()), page_num)
+        finally:
+            if isinstance(pdf, str):
+                doc.close()
+
+        rule_pages: Dict[str, Dict[str, List[List[float]]]] = {}
+        page_totals: Dict[str, Dict[str, int]] = {}
+        for page_num, hits in page_hits.items():
+            page_totals[str(page_num)] = {old_text: len(rects) for old_text, rects in hits.items()}
+            for old_text, rects in hits.items():
+                rule_pages.setdefault(old_text, {})[str(page_num)] = [
+                    [round(rect.x0, 2), round(rect.y0, 2), round(rect.x1, 2), round(rect.y1, 2)] for rect in rects]
+        # 按规则顺序输出
+        report_rules = [{"old": old_text, "new": new_text,
+                         "count": sum(len(rects) for rects in rule_pages[old_text].values()),
+                         "pages": rule_pages[old_text]}
+                        for old_text, new_text in self.rules.items() if old_text in rule_pages]
+
+        elapsed_time = time.time() - start_time
+        summary = {"pages": page_count, "pages_matched": len(page_hits), "rules": len(self.rules),
+                   "rules_matched": len(report_rules), "hits": self.metrics.counters["hits"],
+                   "elapsed": round(elapsed_time, 3)}
+        logger.info(f"扫描完成: {summary['pages_matched']}/{page_count} 页共命中 {summary['hits']} 处，"
+                    f"涉及 {summary['rules_matched']}/{len(self.rules)} 条规则，耗时 {elapsed_time:.2f} 秒")
+        return {"pdf": pdf if isinstance(pdf, str) else doc.name, "summary": summary,
+                "rules": report_rules, "pages": page_totals}
+
+    def _run_method(self, input_pdf: str, output_pdf: str, method: str, save_profile: str = 'compact',
+                    pages: List[int] | None = None) -> int:
+        """按名称调用对应的替换方法"""
+        if method == 'precise':
+            return self._precise_replace_fixed(input_pdf, output_pdf, save_profile, pages)
+        elif method == 'overlay':
+            return self._overlay_replace(input_pdf, output_pdf, save_profile, pages)
+        return self._hybrid_replace(input_pdf, output_pdf, save_profile, pages)
+
+    def _open_document(self, input_pdf: str, output_pdf: str, save_profile: str) -> Tuple[fitz.Document, str]:
+        """
+        打开待处理的文档，并确定实际使用的保存配置
+
+        增量保存只能追加到原文件之后，因此先将输入复制为输出文件再在其上修改；
+        文档经过修复、无法增量保存时改用 balanced 配置。
+        """
+        if save_profile == 'incremental':
+            with fitz.open(input_pdf) as probe:
+                can_incremental = probe.can_save_incrementally()
+            if can_incremental:
+                with self.metrics.stage("open"):
+                    shutil.copyfile(input_pdf, output_pdf)
+                    self._incremental_copy = output_pdf
+                    doc = fitz.open(output_pdf)
+                return doc, save_profile
+            logger.warning("该文档不支持增量保存，改用 balanced 保存配置")
+            save_profile = 'balanced'
+        with self.metrics.stage("open"):
+            doc = fitz.open(input_pdf)
+        return doc, save_profile
+
+    def _save_document(self, doc: fitz.Document, output_pdf: str | BinaryIO, save_profile: str):
+        """按保存配置保存文档（文件路径或可写的文件对象），并记录保存耗时和输出大小"""
+        start_time = time.time()
+        with self.metrics.stage("save"):
+            if isinstance(output_pdf, str):
+                doc.save(output_pdf, **SAVE_PROFILES[save_profile])
+                size = os.path.getsize(output_pdf)
+            else:
+                start_pos = output_pdf.tell()
+                doc.save(output_pdf, **SAVE_PROFILES[save_profile])
+                size = output_pdf.tell() - start_pos
+        self.metrics.count("output_bytes", size)
+        elapsed_time = time.time() - start_time
+        logger.info(f"保存完成（{save_profile}）: 耗时 {elapsed_time:.2f} 秒，文件大小 {size / 1024:.1f} KB")
+
+    def _parallel_replace(self, input_pdf: str, output_pdf: str, method: str, workers: int,
+                          save_profile: str = 'compact') -> int:
+        """
+        页级并行替换：将文档按连续页范围拆分给多个工作进程，
+        每个进程对自己的页范围运行所选方法，最后按页序合并为一个输出文件。
+        """
+        with fitz.open(input_pdf) as doc:
+            page_count = len(doc)
+        workers = min(workers, page_count)
+        if workers <= 1:
+            return self._run_method(input_pdf, output_pdf, method, save_profile)
+        if save_profile == 'incremental':
+            # 合并后的文档是新文档，无法增量保存
+            logger.warning("并行模式不支持增量保存，改用 balanced 保存配置")
+            save_profile = 'balanced'
+
+        # 按页数均分为连续的页范围
+        chunk = -(-page_count // workers)
+        ranges = [(first, min(first + chunk, page_count) - 1) for first in range(0, page_count, chunk)]
+        logger.info(f"使用 {len(ranges)} 个进程并行处理 {page_count} 页")
+
+        with tempfile.TemporaryDirectory() as work_dir:
+            with ProcessPoolExecutor(max_workers=len(ranges), initializer=_init_worker,
+                                     initargs=(self.ruleset, self.fonts_dir)) as pool:
+                futures = [pool.submit(_replace_page_range, input_pdf, first, last, method, work_dir)
+                           for first, last in ranges]
+                results = [future.result() for future in futures]
+
+            for *_, part_metrics in results:
+                self.metrics.merge(part_metrics)
+            with self.metrics.stage("merge"):
+                merged = _merge_page_ranges(input_pdf, results)
+            self._save_document(merged, output_pdf, save_profile)
+            merged.close()
+        return sum(count for _, count, *_ in results)
+
+    def _streaming_replace(self, input_pdf: str, output_pdf: str, method: str, save_profile: str = 'incremental',
+                           window: int = 50, max_memory_mb: float | None = None,
+                           checkpoint_dir: str | None = None, only_pages: List[int] | None = None) -> int:
+        """
+        有界内存的流式替换：按连续页窗口逐段处理，每个窗口处理完后立即写出并释放
+
+        输入先原样复制为中间输出，之后每个窗口打开中间输出、只替换该窗口的页面、增量保存后关闭
+        （页面对象和缓存随文档关闭一起释放）。页面始终留在原文档中，字体、图片等共享资源不会被
+        复制，链接、书签和页码标签也无需恢复；替换时嵌入的字体按 xref 记录，后续窗口直接引用。
+        incremental 保存配置直接把中间输出移动为输出文件，整个过程内存占用与页数无关；
+        其他保存配置需要载入并重写整个文档，收尾保存的内存占用不受窗口和 max_memory_mb 限制。
+        指定 checkpoint_dir 时中间输出保存在该目录，每个窗口写出后记录下一页的页码、替换次数和
+        中间输出的长度，中断后再次运行从记录的页继续。only_pages 限定查找和替换的页面。
+        """
+        with fitz.open(input_pdf) as doc:
+            page_count = len(doc)
+        if save_profile != 'incremental':
+            logger.warning(f"{save_profile} 保存配置需要在最后重写整个文档，收尾保存的内存占用会随页数增长；"
+                           f"使用 incremental 可保持内存占用平稳")
+        window = max(1, window)
+        logger.info(f"流式处理 {page_count} 页，每个窗口 {window} 页")
+
+        with ExitStack() as stack:
+            state_path = None
+            first, total_replacements, embedded_fonts = 0, 0, {}
+            if checkpoint_dir:
+                os.makedirs(checkpoint_dir, exist_ok=True)
+                key = hashlib.sha256("|".join([_file_digest(input_pdf), self.ruleset.fingerprint,
+                                               self.font_registry.fingerprint(), method, __version__,
+                                               _pages_key(only_pages)]).encode()).hexdigest()
+                partial = os.path.join(checkpoint_dir, f"{key}.pdf")
+                state_path = os.path.join(checkpoint_dir, f"{key}.checkpoint")
+                first, total_replacements, embedded_fonts = self._load_checkpoint(partial, state_path)
+                if first:
+                    logger.info(f"从检查点恢复: 已完成 {first}/{page_count} 页，从第 {first + 1} 页继续")
+                    self.metrics.count("resumed_pages", first)
+            else:
+                # 临时文件放在输出目录中，避免系统临时目录空间不足
+                work_dir = stack.enter_context(
+                    tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(output_pdf))))
+                partial = os.path.join(work_dir, "partial.pdf")
+            if not first:
+                with self.metrics.stage("open"):
+                    self._prepare_partial(input_pdf, partial)
+                if state_path:
+                    self._save_checkpoint(state_path, partial, 0, 0, {})
+
+            while first < page_count:
+                last = min(first + window, page_count) - 1
+                targets = range(first, last + 1) if only_pages is None else \
+                    [p for p in only_pages if first <= p <= last]
+                with self.metrics.stage("open"):
+                    doc = fitz.open(partial)
+                try:
+                    total_replacements += self._replace_doc(doc, method, targets, embedded_fonts)
+                    with self.metrics.stage("append"):
+                        if doc.is_dirty:
+                            doc.save(partial, **SAVE_PROFILES['incremental'])
+                finally:
+                    doc.close()
+                self.metrics.count("windows")
+                first = last + 1
+                if state_path:
+                    with self.metrics.stage("checkpoint"):
+                        self._save_checkpoint(state_path, partial, first, total_replacements, embedded_fonts)
+
+                # 释放 MuPDF 的对象缓存后检查内存
+                fitz.TOOLS.store_shrink(100)
+                rss = current_rss_mb()
+                self.metrics.peak("rss_mb", rss)
+                if max_memory_mb and rss is not None and rss > max_memory_mb:
+                    gc.collect()
+                    rss = current_rss_mb()
+                    if rss > max_memory_mb:
+                        if window == 1:
+                            raise MemoryError(f"内存占用 {rss:.0f} MB 超过上限 {max_memory_mb:.0f} MB")
+                        window = max(1, window // 2)
+                        logger.warning(f"内存占用 {rss:.0f} MB 超过上限 {max_memory_mb:.0f} MB，"
+                                       f"窗口缩小为 {window} 页")
+
+            if save_profile == 'incremental':
+                shutil.move(partial, output_pdf)
+                size = os.path.getsize(output_pdf)
+                self.metrics.count("output_bytes", size)
+                logger.info(f"保存完成（{save_profile}）: 文件大小 {size / 1024:.1f} KB")
+            else:
+                with fitz.open(partial) as doc:
+                    self._save_document(doc, output_pdf, save_profile)
+                if checkpoint_dir:
+                    os.remove(partial)
+            if state_path:
+                os.remove(state_path)
+        self.metrics.peak("rss_mb", peak_rss_mb() or current_rss_mb())
+
+        logger.info(f"流式处理完成: {self.metrics.counters['windows']} 个窗口，"
+                    f"峰值内存 {self.metrics.peaks.get('rss_mb', 0):.0f} MB")
+        return total_replacements
+
+    @staticmethod
+    def _prepare_partial(input_pdf: str, partial: str):
+        """将输入复制为中间输出；无法增量保存的文档（如经过修复）先完整写出一次"""
+        with fitz.open(input_pdf) as doc:
+            can_incremental = doc.can_save_incrementally()
+            if not can_incremental:
+                logger.warning("该文档不支持增量保存，先完整写出一份中间输出")
+                doc.save(partial, **SAVE_PROFILES['fast'])
+        if can_incremental:
+            shutil.copyfile(input_pdf, partial)
+
+    @staticmethod
+    def _save_checkpoint(state_path: str, partial: str, next_page: int, replacements: int,
+                         embedded_fonts: Dict[str, int]):
+        """原子写入检查点：中间输出的前 size 个字节已包含前 next_page 页的替换"""
+        state = {"next_page": next_page, "replacements": replacements, "embedded_fonts": embedded_fonts,
+                 "size": os.path.getsize(partial)}
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(state_path), suffix=".tmp")
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, state_path)
+
+    @staticmethod
+    def _load_checkpoint(partial: str, state_path: str) -> Tuple[int, int, Dict[str, int]]:
+        """
+        读取检查点，返回 (下一个待处理的页码, 已完成的替换次数, 已嵌入字体的 {字体名: xref})
+
+        增量保存只在文件末尾追加，中间输出在写完一个窗口、尚未记录检查点时被中断，
+        截回检查点记录的长度即恢复到检查点时的状态；检查点或中间输出无法使用时从头开始。
+        """
+        if not os.path.exists(state_path):
+            return 0, 0, {}
+        try:
+            with open(state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            size = os.path.getsize(partial)
+            if size < state["size"]:
+                raise ValueError(f"中间输出只有 {size} 字节，检查点记录为 {state['size']} 字节")
+            if size > state["size"]:
+                os.truncate(partial, state["size"])
+            return state["next_page"], state["replacements"], state["embedded_fonts"]
+        except Exception as e:
+            logger.warning(f"检查点无法使用，从头开始处理: {e}")
+            return 0, 0, {}
+
     def _find_local_font(self, font_name: str) -> str | None:
         """在本地fonts文件夹中查找字体文件"""
-        for ext in ['.ttf', '.otf', '.ttc']:
-            for f in os.listdir(self.fonts_dir):
-                if f.lower().startswith(font_name.lower()) and f.lower().endswith(ext):
-                    return os.path.join(self.fonts_dir, f)
-        return None
+        return self.font_registry.find(font_name)
+
+    def _collect_actions(self, page: fitz.Page) -> List[dict]:
+        """
+        查找一页中所有需要替换的位置，并从 span 索引中读取每处的样式
+
+        精确替换与覆盖替换共用此方法：每页只提取一次 rawdict，
+        既用于多模式匹配，也用于构建样式查找的空间索引。
+        """
+        actions = []
+        page_num = page.number
+        # 预筛选：先用纯文本一次性检查所有规则，不可能命中的页面直接跳过，
+        # 不再构建 rawdict、空间索引，也不会擦除或改写内容流
+        with self.metrics.stage("extract", page_num):
+            textpage = page.get_textpage()
+            possible = self.matcher.has_match(page.get_text("text", textpage=textpage))
+        if not possible:
+            return actions
 
-    def _precise_replace_fixed(self, input_pdf: str, output_pdf: str) -> int:
+        with self.metrics.stage("search", page_num):
+            page_dict = page.get_text("rawdict", textpage=textpage)
+            page_hits = self.matcher.search_page_matches(page_dict)
+        if not page_hits:
+            return actions
+
+        with self.metrics.stage("style", page_num):
+            span_index = _SpanIndex(page_dict)
+            for old_text, matches in page_hits.items():
+                new_text = self.rules[old_text]
+                for parts in matches:
+                    # 跨行的命中每行擦除一次，新文本只写在第一行部分的位置（part 为 0）
+                    for part, inst in enumerate(parts):
+                        style = span_index.lookup_style(inst, old_text)
+                        actions.append({"rect": inst, "old_text": old_text, "new_text": new_text if part == 0 else "",
+                                        "part": part, **style})
+        self.metrics.count("hits", len(actions), page_num)
+        return actions
+
+    def _precise_replace_fixed(self, input_pdf: str, output_pdf: str, save_profile: str = 'compact',
+                               pages: List[int] | None = None) -> int:
         """
         修复版精确替换方法：采用“查找-擦除-写入”三步法，并精确对齐基线。
         """
         logger.info("使用修复版精确替换方法...")
-        total_replacements = 0
-        BUILTIN_FONTS = ["helv", "cour", "timo", "symb", "zadb", "times", "courier", "helvetica", "symbol",
-                         "zapfdingbats"]
-
-        doc = fitz.open(input_pdf)
+        doc, save_profile = self._open_document(input_pdf, output_pdf, save_profile)
         logger.info(f"打开PDF文件成功，共 {len(doc)} 页")
+        try:
+            total_replacements = self._replace_doc(doc, 'precise', pages)
+            self._save_document(doc, output_pdf, save_profile)
+        finally:
+            doc.close()
+        return total_replacements
+
+    def _overlay_replace(self, input_pdf: str, output_pdf: str, save_profile: str = 'compact',
+                         pages: List[int] | None = None) -> int:
+        """
+        覆盖替换方法：使用白色矩形覆盖原文本，然后插入新文本
+        """
+        logger.info("使用覆盖替换方法...")
+        doc, save_profile = self._open_document(input_pdf, output_pdf, save_profile)
+        try:
+            total_replacements = self._replace_doc(doc, 'overlay', pages)
+            self._save_document(doc, output_pdf, save_profile)
+        finally:
+            doc.close()
+        return total_replacements
+
+    def _hybrid_replace(self, input_pdf: str, output_pdf: str, save_profile: str = 'compact',
+                        pages: List[int] | None = None) -> int:
+        """
+        混合方法：逐页先尝试精确替换，该页擦除不完全时仅对该页改用覆盖方法。
+        整个过程在内存中完成，文档只打开一次、保存一次。
+        """
+        logger.info("使用混合替换方法...")
+        doc, save_profile = self._open_document(input_pdf, output_pdf, save_profile)
+        try:
+            total_replacements = self._replace_doc(doc, 'hybrid', pages)
+            self._save_document(doc, output_pdf, save_profile)
+        finally:
+            doc.close()
+        return total_replacements
 
-        for page_num, page in enumerate(doc):
-
-            # 1. 查找：收集所有需要替换的动作和位置信息
-            actions = []
-            for old_text, new_text in self.rules.items():
-                text_instances = page.search_for(old_text)
-                for inst in text_instances:
-                    text_dict = page.get_text("dict", clip=inst)
-                    fontname, fontsize, text_color = "helv", 12, (0, 0, 0)
-                    # 核心改动：默认基线为矩形框底部，但会尝试寻找更精确的
-                    baseline = inst.y1
-
-                    # 提取字体样式和精确基线
-                    for block in text_dict["blocks"]:
-                        if block["type"] == 0:
-                            for line in block["lines"]:
-                                for span in line["spans"]:
-                                    if old_text in span["text"]:
-                                        fontname = span.get("font", "helv").split("+")[-1]
-                                        fontsize = span.get("size", 12)
-                                        baseline = span.get("origin")[1]  # 获取精确基线Y坐标
-                                        color = span.get("color", 0)
-                                        if isinstance(color, int):
-                                            text_color = (((color >> 16) & 0xFF) / 255.0, ((color >> 8) & 0xFF) / 255.0,
-                                                          (color & 0xFF) / 255.0)
-                                        break
-
-                    actions.append({
-                        "rect": inst, "new_text": new_text, "fontname": fontname,
-                        "fontsize": fontsize, "color": text_color, "baseline": baseline
-                    })
+    def _replace_doc(self, doc: fitz.Document, method: str, pages: Iterable[int] | None = None,
+                     embedded_fonts: Dict[str, int] | None = None) -> int:
+        """
+        对已打开文档中的指定页面执行替换（默认处理全部页面）
+
+        Args:
+            doc: 已打开的文档，替换结果直接写入其中
+            method: 替换方法 ('precise', 'overlay', 'hybrid')
+            pages: 需要处理的页码（从0开始）
+            embedded_fonts: 可选，该文档中已嵌入字体的 {字体名: xref} 表，流式处理时跨窗口沿用
+
+        Returns:
+            替换次数
+        """
+        total_replacements = 0
+        skipped_pages = 0
+        if embedded_fonts is None:
+            embedded_fonts = {}
+
+        for page_num in (range(len(doc)) if pages is None else pages):
+            # 协作式取消：只在页与页之间检查，已开始处理的页面总会完整处理完
+            if self.cancel_event is not None and self.cancel_event.is_set():
+                raise ReplacementCancelled(f"处理在第 {page_num + 1} 页之前被取消")
+            page = doc[page_num]
+            self.metrics.count("pages")
 
+            # 1. 查找：收集所有需要替换的动作、位置和样式信息
+            actions = self._collect_actions(page)
             if not actions:
+                skipped_pages += 1
+                self.metrics.count("pages_skipped")
+                self._report_progress(page_num, len(doc), 0)
                 continue
 
-            # 2. 擦除：将所有找到的旧文本区域标记为空白并应用
+            if method == 'overlay':
+                self._overlay_page(page, actions)
+            else:
+                self._redact_page(page, actions)
+                # hybrid：擦除后立即检查本页是否还残留原文本，有则本页改用覆盖方法
+                if method == 'hybrid':
+                    with self.metrics.stage("verify_page", page_num):
+                        residual = self.matcher.search_page(page.get_text("rawdict"))
+                if method == 'hybrid' and residual:
+                    logger.warning(f"页面 {page_num + 1}: 精确替换未完全成功，该页改用覆盖方法")
+                    self.metrics.count("hybrid_fallbacks", page_num=page_num)
+                    self._overlay_page(page, actions)
+                else:
+                    self._insert_precise(page, actions, embedded_fonts)
+
+            self.metrics.count("pages_replaced")
+            total_replacements += len(actions)
+            detail_logger.info(f"页面 {page_num + 1}: 完成 {len(actions)} 处替换")
+            self._report_progress(page_num, len(doc), len(actions))
+
+        if skipped_pages:
+            logger.info(f"跳过 {skipped_pages} 个不含任何规则原文的页面")
+        return total_replacements
+
+    def _report_progress(self, page_num: int, page_count: int, replacements: int):
+        """每处理完一页调用一次进度回调，页码从1开始"""
+        if self.progress_callback is not None:
+            self.progress_callback({"page": page_num + 1, "pages": page_count, "replacements": replacements})
+
+    def _redact_page(self, page: fitz.Page, actions: List[dict]):
+        """擦除：将所有找到的旧文本区域标记为空白并应用"""
+        with self.metrics.stage("redact", page.number):
             for action in actions:
                 page.add_redact_annot(action["rect"], text="")
 
             page.apply_redactions(images=fitz.PDF_REDACT_IMAGE_NONE)
 
-            # 3. 写入：在擦除后的空白区域写入新文本
-            for action in actions:
-                font_to_use = action["fontname"]
-                font_file_path = None
+    def _insert_precise(self, page: fitz.Page, actions: List[dict], embedded_fonts: Dict[str, int]):
+        """
+        写入：在擦除后的空白区域按原字体和精确基线写入新文本
 
-                # 检查是否是自定义字体并查找文件
-                is_custom_font = font_to_use.lower().split("-")[0] not in BUILTIN_FONTS
-                if is_custom_font:
-                    font_file_path = self._find_local_font(font_to_use)
-                    if not font_file_path:
-                        logger.warning(f"警告: 字体 '{font_to_use}' 未找到，将使用 'helv' 替换。")
-                        font_to_use = "helv"
+        整页的新文本先写入同一个 Shape，最后一次提交，页面只追加一段内容流。
+        """
+        shape = page.new_shape()
+        for action in actions:
+            # 新文本为空（删除规则或跨行命中的后续部分）时只擦除
+            if not action["new_text"]:
+                continue
+            font_to_use, font_file_path = self._resolve_font(action["fontname"])
+            try:
+                # 对于自定义字体，需要先将其注册到页面（每个文档只嵌入一次）
+                if font_file_path:
+                    with self.metrics.stage("font_embed", page.number):
+                        if font_to_use not in embedded_fonts:
+                            self.metrics.count("fonts_embedded")
+                        self.font_registry.embed(page, font_to_use, font_file_path, embedded_fonts)
+
+                # 核心改动：使用精确的插入点 (rect.x0, baseline)
+                insertion_point = fitz.Point(action["rect"].x0, action["baseline"])
+                with self.metrics.stage("insert", page.number):
+                    shape.insert_text(insertion_point,
+                                      action["new_text"],
+                                      fontname=font_to_use,
+                                      fontsize=action["fontsize"],
+                                      color=action["color"])
+            except Exception as e:
+                logger.error(f"写入文本 '{action['new_text']}' 失败: {e}")
+
+        with self.metrics.stage("insert", page.number):
+            shape.commit()
+
+    def _resolve_font(self, font_name: str) -> Tuple[str, str | None]:
+        """
+        确定写入时使用的字体
 
+        Returns:
+            (字体名, 本地字体文件路径)；内置字体的路径为 None，自定义字体找不到时改用 helv
+        """
+        # 检查是否是自定义字体并查找文件
+        if font_name.lower().split("-")[0] in BUILTIN_FONTS:
+            return font_name, None
+        font_file_path = self._find_local_font(font_name)
+        if not font_file_path:
+            detail_logger.warning(f"警告: 字体 '{font_name}' 未找到，将使用 'helv' 替换。")
+            return "helv", None
+        return font_name, font_file_path
+
+    def _overlay_page(self, page: fitz.Page, actions: List[dict]):
+        """
+        覆盖：用白色矩形盖住原文本区域，再写入新文本
+
+        所有矩形和文本收集到同一个 Shape 中一次提交：矩形先绘制、文本在其上，
+        页面只追加一段内容流。
+        """
+        with self.metrics.stage("overlay", page.number):
+            shape = page.new_shape()
+            for repl in sorted(actions, key=lambda x: (x['rect'].y0, x['rect'].x0), reverse=True):
+                rect = fitz.Rect(repl['rect'])
+                shape.draw_rect(rect)
+                shape.finish(color=(1, 1, 1), fill=(1, 1, 1), width=0)
+                if not repl['new_text']:
+                    continue
+                insert_point = fitz.Point(rect.x0, repl['baseline'])
                 try:
-                    # 对于自定义字体，需要先将其注册到页面
-                    if font_file_path:
-                        page.insert_font(fontfile=font_file_path, fontname=font_to_use)
-
-                    # 核心改动：使用精确的插入点 (rect.x0, baseline)
-                    insertion_point = fitz.Point(action["rect"].x0, action["baseline"])
-                    page.insert_text(insertion_point,
-                                     action["new_text"],
-                                     fontname=font_to_use,
-                                     fontsize=action["fontsize"],
-                                     color=action["color"])
-                except Exception as e:
-                    logger.error(f"写入文本 '{action['new_text']}' 失败: {e}")
+                    rc = shape.insert_text(insert_point, repl['new_text'], fontname=repl['fontname'],
+                                           fontsize=repl['fontsize'], color=repl['color'])
+                    if rc < 0: raise Exception("插入失败")
+                except:
+                    detail_logger.debug(f"使用原始字体 {repl['fontname']} 失败，使用标准字体")
+                    shape.insert_text(insert_point, repl['new_text'], fontsize=repl['fontsize'],
+                                      color=repl['color'])
+            shape.commit()
 
-            total_replacements += len(actions)
-            logger.info(f"页面 {page_num + 1}: 完成 {len(actions)} 处替换")
 
-        doc.save(output_pdf, garbage=4, deflate=True, clean=True)
-        doc.close()
-        return total_replacements
+class PdfTemplate:
+    """
+    模板：一次分析，多次渲染
+
+    构造时在模板中查找所有占位符，记录每处的位置、基线、字体、字号和颜色，擦除占位符，
+    并把用到的字体预先注册到对应页面，结果保存为内存中的PDF。之后每次 render()
+    只打开这份已擦除的PDF、按精确基线写入各占位符的值并保存，不再查找、提取样式或嵌入字体。
+    对象只包含内置类型和字节，可以直接传给工作进程。
+    """
 
-    def _overlay_replace(self, input_pdf: str, output_pdf: str) -> int:
+    def __init__(self, template_pdf: str | bytes, placeholders: Iterable[str] | RuleSet, fonts_dir: str = "fonts",
+                 font_registry: FontRegistry | None = None):
         """
-        覆盖替换方法：使用白色矩形覆盖原文本，然后插入新文本
+        Args:
+            template_pdf: 模板PDF文件路径或字节内容
+            placeholders: 占位符原文（如 "{{NAME}}"），或已编译的规则集（只使用其原文本）
+            fonts_dir: 本地字体目录
+            font_registry: 可选，复用已构建的字体注册表
         """
-        logger.info("使用覆盖替换方法...")
-        total_replacements = 0
-        shutil.copy2(input_pdf, output_pdf)
-        doc = fitz.open(output_pdf)
-
-        for page_num, page in enumerate(doc):
-            page_replacements = 0
-            replacements = []
-
-            for old_text, new_text in self.rules.items():
-                text_instances = page.search_for(old_text)
-                for inst in text_instances:
-                    text_dict = page.get_text("dict", clip=inst)
-                    font_info = {'fontname': 'helv', 'fontsize': 12, 'color': (0, 0, 0), 'baseline': inst.y1}
-                    for block in text_dict["blocks"]:
-                        if block["type"] == 0:
-                            for line in block["lines"]:
-                                for span in line["spans"]:
-                                    if old_text in span["text"]:
-                                        font_info['fontname'] = span.get("font", "helv").split("+")[-1]
-                                        font_info['fontsize'] = span.get("size", 12)
-                                        font_info['baseline'] = span.get("origin")[1]
-                                        color = span.get("color", 0)
-                                        if isinstance(color, int):
-                                            font_info['color'] = (((color >> 16) & 0xFF) / 255.0,
-                                                                  ((color >> 8) & 0xFF) / 255.0, (color & 0xFF) / 255.0)
-                                        break
-                    replacements.append({'rect': inst, 'new_text': new_text, 'font_info': font_info})
-
-            if replacements:
-                replacements.sort(key=lambda x: (x['rect'].y0, x['rect'].x0), reverse=True)
-                for repl in replacements:
-                    rect = fitz.Rect(repl['rect'])
-                    font_info = repl['font_info']
-                    shape = page.new_shape()
-                    shape.draw_rect(rect)
-                    shape.finish(color=(1, 1, 1), fill=(1, 1, 1), width=0)
-                    shape.commit()
-                    insert_point = fitz.Point(rect.x0, font_info['baseline'])
-                    try:
-                        rc = page.insert_text(insert_point, repl['new_text'], fontname=font_info['fontname'],
-                                              fontsize=font_info['fontsize'], color=font_info['color'])
-                        if rc < 0: raise Exception("插入失败")
-                    except:
-                        logger.debug(f"使用原始字体 {font_info['fontname']} 失败，使用标准字体")
-                        page.insert_text(insert_point, repl['new_text'], fontsize=font_info['fontsize'],
-                                         color=font_info['color'])
-                    page_replacements += 1
-
-            if page_replacements > 0:
-                total_replacements += page_replacements
-                logger.info(f"页面 {page_num + 1}: 完成 {page_replacements} 处替换")
-
-        doc.save(output_pdf, incremental=False, garbage=4, deflate=True)
-        doc.close()
-        return total_replacements
+        start_time = time.time()
+        ruleset = placeholders if isinstance(placeholders, RuleSet) else RuleSet(dict.fromkeys(placeholders, ""))
+        replacer = PyMuPDFTextReplacer(ruleset, fonts_dir=fonts_dir, font_registry=font_registry)
+        # {页码: [{"old_text", "x", "baseline", "fontname", "fontsize", "color"}, ...]}
+        self.pages: Dict[int, List[dict]] = {}
 
-    def _hybrid_replace(self, input_pdf: str, output_pdf: str) -> int:
+        if isinstance(template_pdf, str):
+            doc = fitz.open(template_pdf)
+        else:
+            doc = fitz.open(stream=template_pdf, filetype="pdf")
+        try:
+            self.page_count = len(doc)
+            embedded_fonts: Dict[str, int] = {}
+            for page in doc:
+                actions = replacer._collect_actions(page)
+                if not actions:
+                    continue
+                replacer._redact_page(page, actions)
+                slots = []
+                for action in actions:
+                    # 跨行的占位符只在第一行部分写入值
+                    if action["part"]:
+                        continue
+                    fontname, font_file_path = replacer._resolve_font(action["fontname"])
+                    # 字体在模板中注册一次，渲染时直接按字体名引用页面上已有的字体
+                    if font_file_path:
+                        replacer.font_registry.embed(page, fontname, font_file_path, embedded_fonts)
+                    else:
+                        page.insert_font(fontname=fontname)
+                    slots.append({"old_text": action["old_text"], "x": action["rect"].x0,
+                                  "baseline": action["baseline"], "fontname": fontname,
+                                  "fontsize": action["fontsize"], "color": tuple(action["color"])})
+                self.pages[page.number] = slots
+            # 预注册的字体此时还没有内容流引用，clean 会把它们从页面资源中清掉，因此不能使用 compact
+            self.data = doc.tobytes(**dict(SAVE_PROFILES['compact'], clean=False))
+        finally:
+            doc.close()
+
+        found = {slot["old_text"] for slots in self.pages.values() for slot in slots}
+        # 模板中实际出现的占位符，渲染时必须提供它们的值
+        self.placeholders = [text for text in ruleset.rules if text in found]
+        missing = [text for text in ruleset.rules if text not in found]
+        if missing:
+            logger.warning(f"模板中没有找到 {len(missing)} 个占位符: {', '.join(missing[:5])}")
+        logger.info(f"模板分析完成: {sum(map(len, self.pages.values()))} 处占位符，分布在 {len(self.pages)} 页，"
+                    f"耗时 {time.time() - start_time:.2f} 秒")
+
+    def render(self, values: Dict[str, str], output_pdf: str | BinaryIO, save_profile: str = 'incremental'):
         """
-        混合方法：先尝试精确替换，失败则使用覆盖方法
+        渲染一个变体
+
+        Args:
+            values: {占位符: 值}，必须包含模板中出现的所有占位符
+            output_pdf: 输出文件路径或可写的文件对象
+            save_profile: 保存配置；incremental（默认）把模板原样写出后只追加新写入的文本，
+                          写入文件对象时改用 fast
         """
-        logger.info("使用混合替换方法...")
-        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp:
-            tmp_path = tmp.name
+        missing = [text for text in self.placeholders if text not in values]
+        if missing:
+            raise ValueError(f"缺少占位符的值: {', '.join(missing[:5])}")
+        if save_profile not in SAVE_PROFILES:
+            raise ValueError(f"未知的保存配置: {save_profile}")
+
+        incremental = save_profile == 'incremental' and isinstance(output_pdf, str)
+        if incremental:
+            with open(output_pdf, 'wb') as f:
+                f.write(self.data)
+            doc = fitz.open(output_pdf)
+        else:
+            doc = fitz.open(stream=self.data, filetype="pdf")
         try:
-            replacements = self._precise_replace_fixed(input_pdf, tmp_path)
-            if self._verify_replacements(tmp_path):
-                shutil.move(tmp_path, output_pdf)
-                return replacements
+            for page_num, slots in self.pages.items():
+                page = doc[page_num]
+                shape = page.new_shape()
+                for slot in slots:
+                    shape.insert_text(fitz.Point(slot["x"], slot["baseline"]), str(values[slot["old_text"]]),
+                                      fontname=slot["fontname"], fontsize=slot["fontsize"], color=slot["color"])
+                shape.commit()
+            if incremental:
+                doc.save(output_pdf, **SAVE_PROFILES['incremental'])
             else:
-                logger.warning("精确替换未完全成功，使用覆盖方法")
-                os.remove(tmp_path)
-                return self._overlay_replace(input_pdf, output_pdf)
-        except Exception as e:
-            logger.error(f"混合替换失败: {e}")
-            if os.path.exists(tmp_path):
-                os.remove(tmp_path)
-            raise
+                doc.save(output_pdf, **SAVE_PROFILES['fast' if save_profile == 'incremental' else save_profile])
+        finally:
+            doc.close()
 
-    def _verify_replacements(self, pdf_path: str) -> bool:
-        """快速验证替换是否成功"""
-        try:
-            doc = fitz.open(pdf_path)
-            for page in doc:
-                for old_text in self.rules.keys():
-                    if page.search_for(old_text):
-                        doc.close()
-                        return False
+    def render_bytes(self, values: Dict[str, str], save_profile: str = 'fast') -> bytes:
+        """渲染一个变体并返回PDF字节内容"""
+        output = io.BytesIO()
+        self.render(values, output, save_profile=save_profile)
+        return output.getvalue()
+
+
+# 并行模式下每个工作进程持有的替换器，由 _init_worker 创建一次后复用
+_worker_replacer: PyMuPDFTextReplacer | None = None
+
+
+def _init_worker(ruleset: RuleSet, fonts_dir: str):
+    """工作进程初始化：用已编译的规则集构建一次替换器"""
+    global _worker_replacer
+    _worker_replacer = PyMuPDFTextReplacer(ruleset, fonts_dir=fonts_dir)
+
+
+def _replace_page_range(input_pdf: str, first: int, last: int, method: str,
+                        work_dir: str) -> Tuple[str, int, Dict[int, List[dict]], dict]:
+    """
+    在工作进程中处理 [first, last] 页，并将该页范围单独保存
+
+    在完整文档上处理可以保证与单进程运行的结果一致；截取页范围之前先记录
+    这些页面上的链接（包括指向其他页范围、截取后会丢失的链接），供合并时恢复。
+
+    Returns:
+        (该页范围的输出文件路径, 替换次数, {页码: 链接列表}, 分阶段统计)
+    """
+    pages = range(first, last + 1)
+    part_output = os.path.join(work_dir, f"part_{first:06d}.pdf")
+    logger.info(f"处理第 {first + 1}-{last + 1} 页")
+    _worker_replacer.metrics = metrics = ReplacementMetrics()
+    with metrics.stage("open"):
+        doc = fitz.open(input_pdf)
+    count = _worker_replacer._replace_doc(doc, method, pages)
+    links = {page_num: doc[page_num].get_links() for page_num in pages}
+    with metrics.stage("save_part"):
+        doc.select(pages)
+        doc.save(part_output, garbage=1)
+    doc.close()
+    metrics.peak("rss_mb", peak_rss_mb() or current_rss_mb())
+    return part_output, count, links, metrics.to_dict()
+
+
+def _merge_page_ranges(input_pdf: str, results: List[Tuple[str, int, Dict[int, List[dict]], dict]]) -> fitz.Document:
+    """
+    按页序合并各页范围的输出，并恢复链接、书签、页码标签和元数据
+
+    Returns:
+        合并后尚未保存的文档
+    """
+    merged = fitz.open()
+    with fitz.open(input_pdf) as src:
+        links: Dict[int, List[dict]] = {}
+        for part_path, _, part_links, *_ in results:
+            with fitz.open(part_path) as part:
+                merged.insert_pdf(part, links=False, annots=True)
+            links.update(part_links)
+        _restore_document_structure(merged, src, links)
+    return merged
+
+
+def _restore_document_structure(doc: fitz.Document, src: fitz.Document, links: Dict[int, List[dict]]):
+    """
+    为按页范围拼接出的文档恢复链接、书签、页码标签和元数据
+
+    替换本身不会改动书签、页码标签和元数据，直接从原文档复制即可。
+    """
+    for page_num, page in enumerate(doc):
+        for link in links.get(page_num, []):
+            page.insert_link(link)
+    doc.set_toc(src.get_toc(simple=False))
+    labels = src.get_page_labels()
+    if labels:
+        doc.set_page_labels(labels)
+    doc.set_metadata(src.metadata)
+
+
+def build_verification_report(pdf: str | fitz.Document, rules: Dict[str, str] | RuleSet) -> dict:
+    """
+    一次提取、一遍扫描统计所有规则的原文本和新文本出现次数
+
+    Args:
+        pdf: PDF文件路径，或已打开的文档（例如刚完成替换、尚未保存的文档）
+        rules: 替换规则字典，或规则集（按其区分大小写、整词匹配选项统计）
+
+    Returns:
+        结构化的验证报告，包含逐规则、逐页的统计；页码从1开始
+    """
+    # 原文本和新文本合并为一个匹配器，每页只提取、扫描一次；
+    # 按最长匹配计数，新文本中包含的较短原文本（如 "Manager B" 中的 "Manager"）不算残留
+    case_sensitive, whole_word = False, False
+    if isinstance(rules, RuleSet):
+        case_sensitive, whole_word = rules.case_sensitive, rules.whole_word
+        rules = rules.rules
+    matcher = _RuleMatcher(dict.fromkeys([*rules.keys(), *rules.values()]), case_sensitive=case_sensitive,
+                           whole_word=whole_word, longest=True)
+    doc = fitz.open(pdf) if isinstance(pdf, str) else pdf
+    try:
+        page_counts: Dict[int, Dict[str, int]] = {}
+        for page_num, page in enumerate(doc, 1):
+            textpage = page.get_textpage()
+            if not matcher.has_match(page.get_text("text", textpage=textpage)):
+                continue
+            hits = matcher.search_page(page.get_text("rawdict", textpage=textpage))
+            if hits:
+                page_counts[page_num] = {text: len(rects) for text, rects in hits.items()}
+    finally:
+        if isinstance(pdf, str):
             doc.close()
-            return True
-        except:
-            return False
 
+    report_rules = []
+    page_totals: Dict[str, Dict[str, int]] = {}
+    summary = {"rules": len(rules), "replaced": 0, "remaining": 0, "not_found": 0}
+    for old_text, new_text in rules.items():
+        pages = {}
+        for page_num, counts in page_counts.items():
+            old_count, new_count = counts.get(old_text, 0), counts.get(new_text, 0)
+            if old_count or new_count:
+                pages[str(page_num)] = {"old": old_count, "new": new_count}
+                totals = page_totals.setdefault(str(page_num), {"old": 0, "new": 0})
+                totals["old"] += old_count
+                totals["new"] += new_count
+        old_total = sum(p["old"] for p in pages.values())
+        new_total = sum(p["new"] for p in pages.values())
+        if old_total:
+            status = "remaining"
+        elif new_total:
+            status = "replaced"
+        else:
+            status = "not_found"
+        summary[status] += 1
+        report_rules.append({"old": old_text, "new": new_text, "status": status,
+                             "old_count": old_total, "new_count": new_total, "pages": pages})
+
+    return {"pdf": pdf if isinstance(pdf, str) else doc.name, "summary": summary,
+            "rules": report_rules, "pages": page_totals}
+
+
+def verify_replacements(pdf_path: str, rules: Dict[str, str] | RuleSet, report_path: str | None = None):
+    """
+    验证替换结果
 
-def verify_replacements(pdf_path: str, rules: Dict[str, str]):
-    """验证替换结果"""
+    Args:
+        pdf_path: 替换后的PDF文件路径
+        rules: 替换规则字典，或替换时使用的规则集（按其匹配选项验证）
+        report_path: 可选，将结构化验证报告写入该JSON文件
+
+    Returns:
+        仍然残留原文本的规则列表
+    """
     logger.info("\n验证替换结果...")
-    doc = fitz.open(pdf_path)
-    success_count, failed_rules = 0, []
+    report = build_verification_report(pdf_path, rules)
+    failed_rules = []
 
-    for old_text, new_text in rules.items():
-        found_old, found_new = False, False
-        for page in doc:
-            if page.search_for(old_text): found_old = True
-            if page.search_for(new_text): found_new = True
-        if found_new and not found_old:
-            success_count += 1
-            logger.info(f"✓ 成功替换: {old_text} -> {new_text}")
-        elif found_old:
+    for rule in report["rules"]:
+        old_text, new_text = rule["old"], rule["new"]
+        if rule["status"] == "replaced":
+            detail_logger.info(f"✓ 成功替换: {old_text} -> {new_text}")
+        elif rule["status"] == "remaining":
             failed_rules.append(old_text)
-            logger.warning(f"✗ 未替换: {old_text} (仍然存在)")
+            detail_logger.warning(f"✗ 未替换: {old_text} (仍然存在)")
         else:
-            logger.info(f"- 未找到: {old_text} (原文本不存在)")
-    doc.close()
-    logger.info(f"\n验证完成: {success_count}/{len(rules)} 规则成功")
+            detail_logger.info(f"- 未找到: {old_text} (原文本不存在)")
+    logger.info(f"\n验证完成: {report['summary']['replaced']}/{report['summary']['rules']} 规则成功")
+
+    if report_path:
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        logger.info(f"验证报告已保存: {report_path}")
     return failed_rules
 
 
@@ -336,6 +1853,11 @@ def main():
   python pdf_replacer_pymupdf.py input.pdf output.pdf rules.txt
   python pdf_replacer_pymupdf.py input.pdf output.pdf rules.txt --method overlay
   python pdf_replacer_pymupdf.py input.pdf output.pdf rules.txt --verify
+  python pdf_replacer_pymupdf.py input.pdf scan.json rules.txt --dry-run
+  python pdf_replacer_pymupdf.py input.pdf output.pdf rules.txt --workers 4
+  python pdf_replacer_pymupdf.py input.pdf output.pdf rules.txt --metrics metrics.json
+  python pdf_replacer_pymupdf.py input.pdf output.pdf rules.txt --result-cache
+  python pdf_replacer_pymupdf.py input.pdf output.pdf rules.txt --checkpoint-dir checkpoints
         """
     )
     parser.add_argument('input_pdf', help='输入PDF文件路径')
@@ -343,8 +1865,33 @@ def main():
     parser.add_argument('rules_file', help='替换规则文件路径')
     parser.add_argument('--method', choices=['precise', 'overlay', 'hybrid'], default='precise',
                         help='替换方法（默认: precise）')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='只扫描不替换：统计各规则在各页的命中次数和位置，以JSON写入输出路径，不生成PDF')
     parser.add_argument('--verify', action='store_true', help='验证替换结果')
+    parser.add_argument('--verify-report', metavar='PATH', help='验证替换结果并将逐规则、逐页的报告保存为JSON')
+    parser.add_argument('--workers', type=int, default=1, help='并行处理的进程数（默认: 1，即单进程）')
+    parser.add_argument('--save-profile', choices=list(SAVE_PROFILES),
+                        help='保存配置（默认: compact，流式处理和检查点模式为 incremental）：fast 速度优先，'
+                             'balanced 折中，compact 体积最小，incremental 只追加改动过的页面和对象；'
+                             '流式处理时只有 incremental 的收尾保存不随页数增加内存')
+    parser.add_argument('--stream', action='store_true', help='流式处理超大文件：按窗口逐段处理和写出，内存占用不随页数增长')
+    parser.add_argument('--window', type=int, default=50, help='流式处理时每个窗口的页数（默认: 50）')
+    parser.add_argument('--max-memory', type=float, metavar='MB', help='流式处理时的内存上限(MB)，超出时自动缩小窗口')
+    parser.add_argument('--checkpoint-dir', metavar='DIR',
+                        help='检查点目录：按 --window 页为间隔记录进度，中断后用相同参数重新运行即从检查点继续')
+    parser.add_argument('--case-sensitive', action='store_true', help='匹配时区分大小写')
+    parser.add_argument('--whole-word', action='store_true', help='只匹配完整单词')
+    parser.add_argument('--no-rules-cache', action='store_true',
+                        help=f'不读写编译后的规则缓存（默认缓存目录: {RULES_CACHE_DIR}）')
+    parser.add_argument('--result-cache', nargs='?', const=RESULTS_CACHE_DIR, metavar='DIR',
+                        help=f'启用替换结果缓存，输入和规则都未变化时直接复用上次的输出（默认目录: {RESULTS_CACHE_DIR}）')
+    parser.add_argument('--result-cache-size', type=float, default=RESULTS_CACHE_MAX_MB, metavar='MB',
+                        help=f'结果缓存的容量上限，超出时淘汰最久未使用的条目（默认: {RESULTS_CACHE_MAX_MB}）')
+    parser.add_argument('--metrics', metavar='PATH', help='将分阶段耗时和计数（含逐页明细）保存为JSON')
+    parser.add_argument('--profile', metavar='PATH', help='使用 cProfile 分析本次运行，统计数据保存到该文件')
     args = parser.parse_args()
+    if (args.stream or args.checkpoint_dir) and args.workers > 1:
+        parser.error("--stream / --checkpoint-dir 不能与 --workers 大于 1 同时使用")
 
     if not os.path.exists(args.input_pdf):
         logger.error(f"输入文件不存在: {args.input_pdf}")
@@ -357,10 +1904,46 @@ def main():
         sys.exit(1)
 
     try:
-        replacer = PyMuPDFTextReplacer(args.rules_file)
-        replacer.replace_pdf(args.input_pdf, args.output_pdf, method=args.method)
-        if args.verify:
-            failed_rules = verify_replacements(args.output_pdf, replacer.rules)
+        ruleset = RuleSet.from_file(args.rules_file, case_sensitive=args.case_sensitive, whole_word=args.whole_word,
+                                    cache_dir=None if args.no_rules_cache else RULES_CACHE_DIR)
+        ruleset.log_summary(f"文件 {args.rules_file} ")
+        replacer = PyMuPDFTextReplacer(ruleset)
+        if args.dry_run:
+            report = replacer.scan(args.input_pdf)
+            with open(args.output_pdf, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            for rule in report["rules"]:
+                detail_logger.info(f"{rule['old']} -> {rule['new']}: {rule['count']} 处，"
+                                   f"{len(rule['pages'])} 页")
+            logger.info(f"扫描报告已保存: {args.output_pdf}")
+            return
+        result_cache = ResultCache(args.result_cache, args.result_cache_size) if args.result_cache else None
+        metrics_callback = None
+        if args.metrics:
+            def metrics_callback(metrics: dict):
+                with open(args.metrics, 'w', encoding='utf-8') as f:
+                    json.dump(metrics, f, ensure_ascii=False, indent=2)
+                logger.info(f"性能统计已保存: {args.metrics}")
+
+        profiler = None
+        if args.profile:
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+        replacer.replace_pdf(args.input_pdf, args.output_pdf, method=args.method, workers=args.workers,
+                             save_profile=args.save_profile, metrics_callback=metrics_callback,
+                             stream=args.stream, window=args.window, max_memory_mb=args.max_memory,
+                             result_cache=result_cache, checkpoint_dir=args.checkpoint_dir)
+        if profiler:
+            import pstats
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            stats_output = io.StringIO()
+            pstats.Stats(profiler, stream=stats_output).sort_stats("cumulative").print_stats(15)
+            logger.info(f"性能分析已保存: {args.profile}（可用 python -m pstats 或 snakeviz 查看）")
+            logger.info("累计耗时最多的调用:\n" + stats_output.getvalue())
+        if args.verify or args.verify_report:
+            failed_rules = verify_replacements(args.output_pdf, replacer.ruleset, report_path=args.verify_report)
             if failed_rules:
                 logger.warning(f"\n有 {len(failed_rules)} 条规则未成功替换")
                 logger.info("建议尝试 --method overlay 或 --method hybrid")
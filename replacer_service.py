@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+PDF文本替换本地服务
+常驻进程持有一组预热的工作进程，规则集和字体注册表常驻内存，
+避免每次调用都重新启动Python、导入fitz、解析规则和扫描字体。
+"""
+
+import sys
+import os
+import json
+import time
+import hashlib
+import argparse
+import logging
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple
+
+from pdf_replacer_pymupdf import FontRegistry, PyMuPDFTextReplacer, RuleSet, SAVE_PROFILES
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# 每个工作进程的常驻状态，由 _init_service_worker 创建
+_font_registry: FontRegistry | None = None
+_named_replacers: Dict[str, PyMuPDFTextReplacer] = {}
+# 请求中直接携带的规则按内容哈希缓存，只保留最近使用的若干个
+_inline_replacers: "OrderedDict[str, PyMuPDFTextReplacer]" = OrderedDict()
+_INLINE_CACHE_SIZE = 16
+
+
+def _init_service_worker(rule_sets: Dict[str, RuleSet], fonts_dir: str):
+    """工作进程初始化：扫描一次字体目录，并预先编译所有命名规则集"""
+    global _font_registry
+    _font_registry = FontRegistry(fonts_dir)
+    for name, ruleset in rule_sets.items():
+        _named_replacers[name] = PyMuPDFTextReplacer(ruleset, font_registry=_font_registry)
+
+
+def _get_replacer(rules: str | Dict[str, str]) -> PyMuPDFTextReplacer:
+    """按规则集名称或规则字典取得已编译的替换器"""
+    if isinstance(rules, str):
+        if rules not in _named_replacers:
+            raise ValueError(f"未知的规则集: {rules}")
+        return _named_replacers[rules]
+
+    key = hashlib.sha256(json.dumps(rules, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+    replacer = _inline_replacers.get(key)
+    if replacer is None:
+        replacer = PyMuPDFTextReplacer(rules, font_registry=_font_registry)
+        _inline_replacers[key] = replacer
+        if len(_inline_replacers) > _INLINE_CACHE_SIZE:
+            _inline_replacers.popitem(last=False)
+    else:
+        _inline_replacers.move_to_end(key)
+    return replacer
+
+
+def _run_file_job(rules: str | Dict[str, str], input_pdf: str, output_pdf: str,
+                  method: str, save_profile: str) -> int:
+    return _get_replacer(rules).replace_pdf(input_pdf, output_pdf, method=method, save_profile=save_profile)
+
+
+def _run_bytes_job(rules: str | Dict[str, str], pdf_bytes: bytes, method: str, save_profile: str) -> bytes:
+    return _get_replacer(rules).replace_bytes(pdf_bytes, method=method, save_profile=save_profile)
+
+
+class ReplacerService:
+    """
+    替换服务核心：预热的进程池加上有界的准入控制
+
+    同时在执行的任务数等于进程数，另有 max_queue 个任务可以排队等待；
+    超出部分立即拒绝（背压），由客户端稍后重试。
+    """
+
+    def __init__(self, rule_sets: Dict[str, RuleSet], fonts_dir: str = "fonts",
+                 workers: int = 0, max_queue: int = 32):
+        self.rule_sets = rule_sets
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self._slots = threading.BoundedSemaphore(self.workers + max_queue)
+        self._lock = threading.Lock()
+        self.stats = {"in_flight": 0, "completed": 0, "failed": 0, "rejected": 0}
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_service_worker,
+                                        initargs=(rule_sets, fonts_dir))
+        # 提交空任务让所有工作进程立即完成初始化，首个请求无需等待预热
+        for future in [self.pool.submit(len, "") for _ in range(self.workers)]:
+            future.result()
+        logger.info(f"服务已就绪: {self.workers} 个工作进程，排队上限 {max_queue}，"
+                    f"规则集 {', '.join(rule_sets) or '(无)'}")
+
+    def submit(self, fn, *args):
+        """
+        在进程池中执行任务并等待结果
+
+        Raises:
+            OverflowError: 执行和排队的任务都已满，需要客户端稍后重试
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.stats["rejected"] += 1
+            raise OverflowError("服务繁忙，请稍后重试")
+        with self._lock:
+            self.stats["in_flight"] += 1
+        try:
+            result = self.pool.submit(fn, *args).result()
+            with self._lock:
+                self.stats["completed"] += 1
+            return result
+        except Exception:
+            with self._lock:
+                self.stats["failed"] += 1
+            raise
+        finally:
+            with self._lock:
+                self.stats["in_flight"] -= 1
+            self._slots.release()
+
+    def health(self) -> dict:
+        with self._lock:
+            return {"workers": self.workers, "max_queue": self.max_queue,
+                    "rule_sets": list(self.rule_sets), **self.stats}
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True)
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP接口:
+      GET  /health                 服务状态
+      POST /replace  (JSON)        {"input": 路径, "output": 路径, "rules": 规则集名称或规则字典,
+                                    "method": ..., "save_profile": ...}，返回替换次数
+      POST /replace  (PDF字节)      查询参数 rules/method/save_profile，直接返回输出PDF
+    """
+
+    server_version = "PDFReplacerService/1.0"
+
+    @property
+    def service(self) -> ReplacerService:
+        return self.server.service
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} - {format % args}")
+
+    def _send_json(self, status: int, payload: dict, headers: Dict[str, str] | None = None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if urllib.parse.urlparse(self.path).path == "/health":
+            self._send_json(200, self.service.health())
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        url = urllib.parse.urlparse(self.path)
+        if url.path != "/replace":
+            self._send_json(404, {"error": "not found"})
+            return
+
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        start_time = time.time()
+        try:
+            if self.headers.get("Content-Type", "").startswith("application/json"):
+                job = json.loads(body)
+                if not isinstance(job, dict):
+                    raise ValueError("任务必须是JSON对象")
+                rules, method, save_profile = self._job_options(job)
+                input_pdf, output_pdf = self._job_paths(job)
+                count = self.service.submit(_run_file_job, rules, input_pdf, output_pdf, method, save_profile)
+                self._send_json(200, {"status": "ok", "replacements": count, "output": output_pdf,
+                                      "elapsed": round(time.time() - start_time, 3)})
+            else:
+                query = {key: values[-1] for key, values in urllib.parse.parse_qs(url.query).items()}
+                rules, method, save_profile = self._job_options(query)
+                output = self.service.submit(_run_bytes_job, rules, body, method, save_profile)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/pdf")
+                self.send_header("Content-Length", str(len(output)))
+                self.end_headers()
+                self.wfile.write(output)
+        except OverflowError as e:
+            self._send_json(503, {"status": "busy", "error": str(e)}, headers={"Retry-After": "1"})
+        except (KeyError, ValueError) as e:
+            self._send_json(400, {"status": "error", "error": f"{type(e).__name__}: {e}"})
+        except Exception as e:
+            logger.error(f"处理请求失败: {e}")
+            self._send_json(500, {"status": "error", "error": f"{type(e).__name__}: {e}"})
+
+    def _job_options(self, job: dict) -> Tuple[str | Dict[str, str], str, str]:
+        """解析并校验任务选项：(规则, 替换方法, 保存配置)"""
+        rules = job.get("rules", "default")
+        method = job.get("method", "precise")
+        save_profile = job.get("save_profile", "compact")
+        if method not in ('precise', 'overlay', 'hybrid'):
+            raise ValueError(f"未知的替换方法: {method}")
+        if save_profile not in SAVE_PROFILES:
+            raise ValueError(f"未知的保存配置: {save_profile}")
+        if isinstance(rules, dict):
+            if not all(isinstance(key, str) and isinstance(value, str) for key, value in rules.items()):
+                raise ValueError("规则字典的原文和替换文本都必须是字符串")
+        elif not isinstance(rules, str):
+            raise ValueError(f"rules 必须是规则集名称或规则字典，而不是 {type(rules).__name__}")
+        elif rules not in self.service.rule_sets:
+            raise ValueError(f"未知的规则集: {rules}")
+        return rules, method, save_profile
+
+    @staticmethod
+    def _job_paths(job: dict) -> Tuple[str, str]:
+        """解析并校验文件任务的 (输入路径, 输出路径)"""
+        input_pdf, output_pdf = job["input"], job["output"]
+        if not isinstance(input_pdf, str) or not isinstance(output_pdf, str):
+            raise ValueError("input 和 output 必须是文件路径")
+        same = (os.path.samefile(input_pdf, output_pdf) if os.path.exists(input_pdf) and os.path.exists(output_pdf)
+                else os.path.realpath(input_pdf) == os.path.realpath(output_pdf))
+        if same:
+            raise ValueError("输出文件不能与输入文件相同")
+        return input_pdf, output_pdf
+
+
+def serve(rule_sets: Dict[str, RuleSet], host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+          fonts_dir: str = "fonts", workers: int = 0, max_queue: int = 32):
+    """启动本地替换服务，直到被中断"""
+    service = ReplacerService(rule_sets, fonts_dir=fonts_dir, workers=workers, max_queue=max_queue)
+    httpd = ThreadingHTTPServer((host, port), _RequestHandler)
+    httpd.daemon_threads = True
+    httpd.service = service
+    logger.info(f"监听 http://{host}:{port}")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("正在停止服务...")
+    finally:
+        httpd.server_close()
+        service.shutdown()
+
+
+def submit(input_pdf: str, output_pdf: str, url: str = f"http://{DEFAULT_HOST}:{DEFAULT_PORT}",
+           rules: str | Dict[str, str] = "default", method: str = "precise", save_profile: str = "compact",
+           retries: int = 10) -> dict:
+    """
+    向本地服务提交一个文件任务；服务繁忙(503)时按 Retry-After 等待后重试
+
+    Returns:
+        服务返回的结果 {"status", "replacements", "output", "elapsed"}
+    """
+    payload = json.dumps({"input": os.path.abspath(input_pdf), "output": os.path.abspath(output_pdf),
+                          "rules": rules, "method": method, "save_profile": save_profile}).encode('utf-8')
+    for attempt in range(retries + 1):
+        request = urllib.request.Request(f"{url}/replace", data=payload,
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            result = json.loads(e.read() or b"{}")
+            if e.code != 503 or attempt == retries:
+                raise RuntimeError(result.get("error", f"HTTP {e.code}")) from None
+            time.sleep(float(e.headers.get("Retry-After", 1)))
+
+
+def _parse_rule_sets(specs, case_sensitive: bool = False, whole_word: bool = False) -> Dict[str, RuleSet]:
+    """解析 --rules 参数：'名称=规则文件' 或单独的规则文件（名称为 default）"""
+    rule_sets = {}
+    for spec in specs or []:
+        name, _, path = spec.rpartition("=")
+        ruleset = RuleSet.from_file(path, case_sensitive=case_sensitive, whole_word=whole_word)
+        ruleset.log_summary(f"文件 {path} ")
+        rule_sets[name or "default"] = ruleset
+    return rule_sets
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(
+        description='PDF文本替换本地服务',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+  python replacer_service.py serve --rules rules.txt --workers 4
+  python replacer_service.py serve --rules default=rules.txt --rules invoices=invoice_rules.txt
+  python replacer_service.py submit input.pdf output.pdf
+  python replacer_service.py submit input.pdf output.pdf --rule-set invoices --method overlay
+        """
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = subparsers.add_parser('serve', help='启动服务')
+    serve_parser.add_argument('--rules', action='append', metavar='[名称=]规则文件',
+                              help='预加载的规则集，可重复指定；未写名称时为 default')
+    serve_parser.add_argument('--host', default=DEFAULT_HOST, help=f'监听地址（默认: {DEFAULT_HOST}）')
+    serve_parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'监听端口（默认: {DEFAULT_PORT}）')
+    serve_parser.add_argument('--workers', type=int, default=0, help='工作进程数（默认: CPU核数）')
+    serve_parser.add_argument('--max-queue', type=int, default=32, help='排队任务上限，超出时返回503（默认: 32）')
+    serve_parser.add_argument('--fonts-dir', default='fonts', help='本地字体目录（默认: fonts）')
+    serve_parser.add_argument('--case-sensitive', action='store_true', help='预加载的规则集匹配时区分大小写')
+    serve_parser.add_argument('--whole-word', action='store_true', help='预加载的规则集只匹配完整单词')
+
+    submit_parser = subparsers.add_parser('submit', help='向服务提交任务')
+    submit_parser.add_argument('input_pdf', help='输入PDF文件路径')
+    submit_parser.add_argument('output_pdf', help='输出PDF文件路径')
+    submit_parser.add_argument('--rule-set', default='default', help='使用的规则集名称（默认: default）')
+    submit_parser.add_argument('--method', choices=['precise', 'overlay', 'hybrid'], default='precise',
+                               help='替换方法（默认: precise）')
+    submit_parser.add_argument('--save-profile', choices=list(SAVE_PROFILES), default='compact',
+                               help='保存配置（默认: compact）')
+    submit_parser.add_argument('--url', default=f"http://{DEFAULT_HOST}:{DEFAULT_PORT}", help='服务地址')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        rule_sets = _parse_rule_sets(args.rules, case_sensitive=args.case_sensitive, whole_word=args.whole_word)
+        serve(rule_sets, host=args.host, port=args.port, fonts_dir=args.fonts_dir,
+              workers=args.workers, max_queue=args.max_queue)
+        return
+
+    if os.path.abspath(args.input_pdf) == os.path.abspath(args.output_pdf):
+        logger.error("输出文件不能与输入文件相同！")
+        sys.exit(1)
+    try:
+        result = submit(args.input_pdf, args.output_pdf, url=args.url, rules=args.rule_set,
+                        method=args.method, save_profile=args.save_profile)
+        logger.info(f"处理完成！总计替换: {result['replacements']} 处，耗时: {result['elapsed']:.2f} 秒")
+        logger.info(f"输出文件: {result['output']}")
+    except Exception as e:
+        logger.error(f"处理失败: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+PDF模板批量渲染脚本
+模板只分析一次（查找占位符、擦除、注册字体），随后在进程池中按每一行的值渲染出大量个性化PDF。
+"""
+
+import sys
+import os
+import csv
+import json
+import re
+import time
+import argparse
+import itertools
+import logging
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from pdf_replacer_pymupdf import PdfTemplate, SAVE_PROFILES
+
+logger = logging.getLogger(__name__)
+
+# 每个工作进程持有的模板，由 _init_render_worker 接收一次后渲染该进程的所有变体
+_worker_template: PdfTemplate | None = None
+
+# 每个任务渲染的变体数，减少进程间通信次数
+_CHUNK_SIZE = 16
+
+
+def is_placeholder(key: str) -> bool:
+    """
+    判断取值文件中的列名是否是占位符
+
+    占位符必须首尾都是分隔符（如 {{NAME}}、[ID]、<name>）。id、name 这类普通列名只作为数据列
+    （例如用于 --name-field），否则会按不区分大小写的子串把模板中 "identity"、"Name:" 等文字也擦除。
+    """
+    def is_delimiter(ch: str) -> bool:
+        return not (ch.isalnum() or ch.isspace() or ch == "_")
+
+    return len(key) > 2 and is_delimiter(key[0]) and is_delimiter(key[-1])
+
+
+def output_name(value: str) -> str:
+    """
+    把 --name-field 的取值转换为安全的文件名（不含扩展名）
+
+    只保留最后一段路径，"../x"、"/tmp/x" 都只得到 "x"；字母、数字、下划线、点和连字符以外的字符替换为下划线。
+    结果为空时返回空字符串，由调用方改用序号命名。
+    """
+    name = os.path.basename(value.replace("\\", "/"))
+    return re.sub(r"[^\w.\-]+", "_", name).strip("._")[:200]
+
+
+def _init_render_worker(template: PdfTemplate):
+    global _worker_template
+    _worker_template = template
+
+
+def _render_chunk(chunk: List[Tuple[Dict[str, str], str]], save_profile: str) -> List[dict]:
+    """渲染一组变体，单个变体出错只记录在其结果中"""
+    results = []
+    for values, output_pdf in chunk:
+        start_time = time.time()
+        result = {"output": output_pdf}
+        try:
+            _worker_template.render(values, output_pdf, save_profile=save_profile)
+            result["status"] = "ok"
+        except Exception as e:
+            result["status"] = "error"
+            result["error"] = f"{type(e).__name__}: {e}"
+        result["elapsed"] = round(time.time() - start_time, 4)
+        results.append(result)
+    return results
+
+
+def render_variants(template: PdfTemplate, variants: Iterable[Tuple[Dict[str, str], str]], workers: int = 0,
+                    save_profile: str = 'incremental', report_path: str | None = None) -> Iterator[dict]:
+    """
+    并行渲染多个变体
+
+    Args:
+        template: 已分析的模板
+        variants: (占位符取值, 输出PDF路径) 序列，可以是生成器，按需读取
+        workers: 进程数，0 表示使用 CPU 核数
+        save_profile: 保存配置，见 PdfTemplate.render
+        report_path: JSONL 报告路径，每渲染完一个变体写入一行
+
+    Yields:
+        每个变体的结果，按完成顺序产出
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = workers * 2
+
+    report = open(report_path, 'w', encoding='utf-8') if report_path else None
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_render_worker,
+                                 initargs=(template,)) as pool:
+            pending = set()
+            variant_iter = iter(variants)
+            while True:
+                while len(pending) < max_pending:
+                    chunk = [variant for _, variant in zip(range(_CHUNK_SIZE), variant_iter)]
+                    if not chunk:
+                        break
+                    pending.add(pool.submit(_render_chunk, chunk, save_profile))
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for result in future.result():
+                        if report:
+                            report.write(json.dumps(result, ensure_ascii=False) + "\n")
+                        yield result
+    finally:
+        if report:
+            report.close()
+
+
+def read_variants(values_file: str) -> Iterator[Dict[str, str]]:
+    """逐行读取变体取值：.csv 文件按表头取列，其他文件按 JSONL（每行一个对象）读取"""
+    with open(values_file, 'r', encoding='utf-8', newline='') as f:
+        if values_file.lower().endswith('.csv'):
+            yield from csv.DictReader(f)
+            return
+        for line_num, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                logger.warning(f"第 {line_num} 行不是有效的JSON，跳过: {e}")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(
+        description='PDF模板批量渲染工具',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+取值文件:
+  JSONL - 每行一个对象，例如 {"{{NAME}}": "张三", "{{ID}}": "A001"}
+  CSV   - 表头为占位符，每行一个变体
+  第一行中首尾都是分隔符的键（如 {{NAME}}、[ID]）为占位符，其他列（如 id、name）只作为数据列；
+  --name-field 可以是占位符，也可以是数据列。
+
+示例:
+  python template_renderer.py template.pdf customers.jsonl --output-dir letters/
+  python template_renderer.py template.pdf customers.csv --output-dir letters/ --name-field "{{ID}}" --workers 8
+        """
+    )
+    parser.add_argument('template_pdf', help='模板PDF文件路径')
+    parser.add_argument('values_file', help='变体取值文件（JSONL 或 CSV）')
+    parser.add_argument('--output-dir', required=True, help='输出目录')
+    parser.add_argument('--name-field',
+                        help='用该字段的值作为输出文件名（默认按序号命名；路径部分和特殊字符会被去掉，重名时加序号后缀）')
+    parser.add_argument('--workers', type=int, default=0, help='并行渲染的进程数（默认: CPU核数）')
+    parser.add_argument('--save-profile', choices=list(SAVE_PROFILES), default='incremental',
+                        help='保存配置（默认: incremental，只在模板之后追加写入的文本）')
+    parser.add_argument('--report', default='render_results.jsonl', help='JSONL结果报告路径（默认: render_results.jsonl）')
+    parser.add_argument('--fonts-dir', default='fonts', help='本地字体目录（默认: fonts）')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.template_pdf):
+        logger.error(f"模板文件不存在: {args.template_pdf}")
+        sys.exit(1)
+    if not os.path.exists(args.values_file):
+        logger.error(f"取值文件不存在: {args.values_file}")
+        sys.exit(1)
+
+    rows = read_variants(args.values_file)
+    first = next(rows, None)
+    if first is None:
+        logger.error(f"取值文件为空: {args.values_file}")
+        sys.exit(1)
+    placeholders = [key for key in first if is_placeholder(key)]
+    data_columns = [key for key in first if not is_placeholder(key)]
+    if data_columns:
+        logger.info(f"以下列不是占位符格式，只作为数据列使用: {', '.join(data_columns)}")
+    if not placeholders:
+        logger.error("取值文件中没有占位符列（占位符需要用分隔符包围，例如 {{NAME}}）")
+        sys.exit(1)
+    template = PdfTemplate(args.template_pdf, placeholders, fonts_dir=args.fonts_dir)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    def variants() -> Iterator[Tuple[Dict[str, str], str]]:
+        # 已使用的文件名（不区分大小写），重名的变体加 _2、_3 后缀，不覆盖前面的输出
+        used = set()
+        for index, values in enumerate(itertools.chain([first], rows), 1):
+            name = output_name(str(values.get(args.name_field) or "")) if args.name_field else ""
+            name = name or f"variant_{index:06d}"
+            unique, suffix = name, 1
+            while unique.lower() in used:
+                suffix += 1
+                unique = f"{name}_{suffix}"
+            if unique != name:
+                logger.warning(f"第 {index} 行的文件名 {name} 重复，改为 {unique}")
+            used.add(unique.lower())
+            yield values, os.path.join(args.output_dir, f"{unique}.pdf")
+
+    start_time = time.time()
+    succeeded, failed = 0, 0
+    for result in render_variants(template, variants(), workers=args.workers, save_profile=args.save_profile,
+                                  report_path=args.report):
+        if result["status"] == "ok":
+            succeeded += 1
+        else:
+            failed += 1
+            logger.error(f"✗ {result['output']}: {result['error']}")
+    elapsed_time = time.time() - start_time
+
+    logger.info(f"渲染完成: 成功 {succeeded} 个，失败 {failed} 个")
+    logger.info(f"耗时: {elapsed_time:.2f} 秒（{(succeeded + failed) / max(elapsed_time, 1e-6):.1f} 个/秒）")
+    logger.info(f"结果报告: {args.report}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
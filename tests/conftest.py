@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+FONTS_DIR = os.path.join(REPO_DIR, "fonts")
+EMBEDDED_FONT = os.path.join(FONTS_DIR, "LiberationSans-Bold.ttf")
+
+
+@pytest.fixture
+def fonts_dir():
+    return FONTS_DIR
+
+
+@pytest.fixture
+def embedded_font():
+    return EMBEDDED_FONT
@@ -0,0 +1,85 @@
+import os
+
+import fitz
+
+from batch_replacer import batch_replace
+from corpus_index import CorpusIndex
+from pdf_replacer_pymupdf import PyMuPDFTextReplacer, RuleSet
+
+
+def _make_pdf(path, pages):
+    doc = fitz.open()
+    for text in pages:
+        doc.new_page().insert_text((72, 100), text)
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+def _corpus(tmp_path):
+    return [
+        _make_pdf(tmp_path / "a.pdf", ["Old Company annual report", "nothing here", "see the Old\nCompany"]),
+        _make_pdf(tmp_path / "b.pdf", ["Unrelated text", "Companies and the old ways"]),
+        _make_pdf(tmp_path / "c.pdf", ["合同甲方：旧公司", "乙方"]),
+        _make_pdf(tmp_path / "d.pdf", ["a multi-\nline word"]),
+    ]
+
+
+def _hit_pages(replacer, path):
+    return sorted(int(page) - 1 for page in replacer.scan(path)["pages"])
+
+
+def test_candidates_cover_actual_hits(tmp_path, fonts_dir):
+    paths = _corpus(tmp_path)
+    with CorpusIndex(str(tmp_path / "corpus.db")) as index:
+        assert index.update(paths, workers=1)["added"] == 4
+        for rules in ({"Old Company": "New"}, {"旧公司": "新公司"}, {"compan": "x"}, {"multiline": "x"},
+                      {"Old Company": "New", "乙方": "丙方"}):
+            ruleset = RuleSet(rules)
+            replacer = PyMuPDFTextReplacer(ruleset, fonts_dir=fonts_dir)
+            selection = index.select(ruleset, paths)
+            for path in paths:
+                hits = _hit_pages(replacer, path)
+                assert selection[path] is not None
+                assert set(hits) <= set(selection[path]), (rules, path)
+                if not hits:
+                    assert selection[path] == [], (rules, path)
+
+
+def test_update_is_incremental(tmp_path):
+    paths = _corpus(tmp_path)
+    index_path = str(tmp_path / "corpus.db")
+    with CorpusIndex(index_path) as index:
+        index.update(paths, workers=1)
+    with CorpusIndex(index_path) as index:
+        assert index.update(paths, workers=1)["unchanged"] == 4
+
+        # 修改后的文件在重新索引前需要完整处理，重新索引后按新内容筛选
+        _make_pdf(tmp_path / "b.pdf", ["now with Old Company"])
+        ruleset = RuleSet({"Old Company": "New"})
+        assert index.select(ruleset, paths)[paths[1]] is None
+        os.remove(paths[3])
+        stats = index.update(paths[:3], workers=1)
+        assert (stats["updated"], stats["removed"]) == (1, 1)
+        selection = index.select(ruleset, paths)
+        assert selection[paths[1]] == [0]
+        assert selection[paths[3]] is None
+    assert os.path.exists(index_path)
+
+
+def test_batch_copies_skipped_files(tmp_path, fonts_dir):
+    paths = _corpus(tmp_path)
+    index_path = str(tmp_path / "corpus.db")
+    with CorpusIndex(index_path) as index:
+        index.update(paths, workers=1)
+    out_dir = tmp_path / "out"
+    jobs = [(path, str(out_dir / os.path.basename(path))) for path in paths]
+    results = {os.path.basename(r["input"]): r
+               for r in batch_replace(jobs, {"Old Company": "New Company"}, workers=1, fonts_dir=fonts_dir,
+                                      index_path=index_path)}
+    assert results["a.pdf"]["status"] == "ok"
+    for name in ("b.pdf", "c.pdf", "d.pdf"):
+        assert results[name]["status"] == "skipped"
+        # 跳过的文件原样复制，报告中的输出路径确实存在
+        with open(tmp_path / name, "rb") as src, open(results[name]["output"], "rb") as dst:
+            assert src.read() == dst.read()
@@ -0,0 +1,100 @@
+import fitz
+import pytest
+
+from pdf_replacer_pymupdf import PyMuPDFTextReplacer, RuleSet, _RuleMatcher
+
+
+def _make_page():
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_textbox(fitz.Rect(72, 72, 200, 200),
+                        "The new Project Manager is the boss of the team and the Project", fontsize=11)
+    page.insert_text((72, 300), "Manager there. MANAGER A and manager  a in one line.")
+    page.insert_text((72, 400), "aaa multi-\nline bbb")
+    return doc, page
+
+
+def _rounded(rects):
+    return [tuple(round(v, 1) for v in rect) for rect in rects]
+
+
+@pytest.mark.parametrize("pattern", ["Project Manager", "Project", "manager a", "boss of the team", "Manager there"])
+def test_search_page_matches_search_for(pattern):
+    doc, page = _make_page()
+    matcher = _RuleMatcher([pattern])
+    hits = matcher.search_page(page.get_text("rawdict"))
+    expected = page.search_for(pattern)
+    assert expected
+    assert _rounded(hits[pattern]) == _rounded(expected)
+    doc.close()
+
+
+def test_wrapped_match_keeps_parts_together():
+    doc, page = _make_page()
+    matches = _RuleMatcher(["Project Manager"]).search_page_matches(page.get_text("rawdict"))
+    assert [len(parts) for parts in matches["Project Manager"]] == [1, 2]
+    doc.close()
+
+
+def test_hyphen_broken_word_matches():
+    doc, page = _make_page()
+    matcher = _RuleMatcher(["multiline"])
+    assert matcher.has_match(page.get_text("text"))
+    matches = matcher.search_page_matches(page.get_text("rawdict"))
+    assert len(matches["multiline"]) == 1 and len(matches["multiline"][0]) == 2
+    doc.close()
+
+
+def test_longest_match_and_options():
+    text = "manager a and manager b, managerial"
+    matcher = _RuleMatcher(["manager", "manager a"], longest=True)
+    assert [(s, e) for s, e, _ in matcher.select_matches(text)] == [(0, 9), (14, 21), (25, 32)]
+    whole = _RuleMatcher(["manager"], whole_word=True)
+    assert len(whole.select_matches(text)) == 2
+    exact = _RuleMatcher(["Manager"], case_sensitive=True)
+    assert exact.select_matches(text) == []
+
+
+def test_ruleset_from_file_cache(tmp_path):
+    rules_file = tmp_path / "rules.txt"
+    rules_file.write_text("# 注释\nManager|Boss\nManager A|Boss A\nManager|Chief\n", encoding="utf-8")
+    first = RuleSet.from_file(str(rules_file), cache_dir=str(tmp_path / "cache"))
+    cached = RuleSet.from_file(str(rules_file), cache_dir=str(tmp_path / "cache"))
+    assert first.rules == cached.rules == {"Manager": "Chief", "Manager A": "Boss A"}
+    assert first.fingerprint == cached.fingerprint
+
+
+def test_wrapped_phrase_replaced_once(tmp_path, fonts_dir):
+    doc, page = _make_page()
+    input_pdf = str(tmp_path / "in.pdf")
+    doc.save(input_pdf)
+    doc.close()
+    output_pdf = str(tmp_path / "out.pdf")
+    replacer = PyMuPDFTextReplacer({"Project Manager": "Lead", "multiline": "single"}, fonts_dir=fonts_dir)
+    replacer.replace_pdf(input_pdf, output_pdf)
+    with fitz.open(output_pdf) as out:
+        text = out[0].get_text()
+        assert out[0].search_for("Project Manager") == []
+    assert text.count("Lead") == 2
+    assert text.count("single") == 1
+    assert "multi-" not in text
+
+
+def test_batch_cli_match_options(tmp_path, monkeypatch, fonts_dir):
+    import batch_replacer
+
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 100), "cat Cat category")
+    doc.save(str(tmp_path / "in.pdf"))
+    doc.close()
+    rules_file = tmp_path / "rules.txt"
+    rules_file.write_text("cat|dog\n", encoding="utf-8")
+    monkeypatch.setattr("sys.argv", ["batch_replacer.py", str(tmp_path / "in.pdf"), str(rules_file),
+                                     "--output-dir", str(tmp_path / "out"), "--workers", "1",
+                                     "--report", str(tmp_path / "report.jsonl"), "--fonts-dir", fonts_dir,
+                                     "--case-sensitive", "--whole-word"])
+    batch_replacer.main()
+
+    with fitz.open(str(tmp_path / "out" / "in_replaced.pdf")) as out:
+        text = out[0].get_text()
+    assert "dog" in text and "Cat" in text and "category" in text
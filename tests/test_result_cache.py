@@ -0,0 +1,72 @@
+import os
+
+import fitz
+
+from pdf_replacer_pymupdf import PyMuPDFTextReplacer, ResultCache
+
+
+def _make_pdf(path, text="Old Company report"):
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 100), text)
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+def test_result_cache_hit_and_invalidation(tmp_path, fonts_dir):
+    input_pdf = _make_pdf(tmp_path / "in.pdf")
+    cache = ResultCache(str(tmp_path / "cache"))
+    replacer = PyMuPDFTextReplacer({"Old Company": "New Company"}, fonts_dir=fonts_dir)
+
+    assert replacer.replace_pdf(input_pdf, str(tmp_path / "a.pdf"), result_cache=cache) == 1
+    assert replacer.metrics.counters["result_cache_misses"] == 1
+    assert replacer.replace_pdf(input_pdf, str(tmp_path / "b.pdf"), result_cache=cache) == 1
+    assert replacer.metrics.counters["result_cache_hits"] == 1
+    with open(tmp_path / "a.pdf", "rb") as a, open(tmp_path / "b.pdf", "rb") as b:
+        assert a.read() == b.read()
+
+    # 规则、方法或输入内容变化时不能命中
+    other = PyMuPDFTextReplacer({"Old Company": "Other Company"}, fonts_dir=fonts_dir)
+    other.replace_pdf(input_pdf, str(tmp_path / "c.pdf"), result_cache=cache)
+    assert other.metrics.counters["result_cache_misses"] == 1
+    replacer.replace_pdf(input_pdf, str(tmp_path / "d.pdf"), method="overlay", result_cache=cache)
+    assert replacer.metrics.counters["result_cache_misses"] == 1
+    _make_pdf(tmp_path / "in.pdf", "Old Company report, second edition")
+    replacer.replace_pdf(input_pdf, str(tmp_path / "e.pdf"), result_cache=cache)
+    assert replacer.metrics.counters["result_cache_misses"] == 1
+
+
+def test_result_cache_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"))
+    for name in ("a", "b", "c"):
+        (tmp_path / f"{name}.pdf").write_bytes(b"x" * 1000)
+    cache.store("a", str(tmp_path / "a.pdf"), 1)
+    cache.store("b", str(tmp_path / "b.pdf"), 2)
+    os.utime(os.path.join(cache.cache_dir, "a.pdf"), (1, 1))
+    os.utime(os.path.join(cache.cache_dir, "b.pdf"), (2, 2))
+    # 读取 a 会刷新它的使用时间，超出容量时先淘汰 b
+    assert cache.fetch("a", str(tmp_path / "out.pdf")) == 1
+
+    cache.max_bytes = 2500
+    cache.store("c", str(tmp_path / "c.pdf"), 3)
+    assert sorted(os.listdir(cache.cache_dir)) == ["a.json", "a.pdf", "c.json", "c.pdf"]
+    assert cache.fetch("b", str(tmp_path / "out.pdf")) is None
+
+
+def test_result_cache_scans_only_when_over_limit(tmp_path, monkeypatch):
+    cache = ResultCache(str(tmp_path / "cache"), max_mb=1)
+    (tmp_path / "out.pdf").write_bytes(b"x" * 100_000)
+    scans = []
+    monkeypatch.setattr(cache, "_entries", lambda original=cache._entries: scans.append(1) or original())
+
+    # 10 次写入共约 1 MB 以内，不需要扫描目录
+    for index in range(10):
+        cache.store(f"k{index}", str(tmp_path / "out.pdf"), index)
+    assert scans == []
+    # 覆盖已有条目不重复计入大小
+    cache.store("k0", str(tmp_path / "out.pdf"), 0)
+    assert scans == []
+
+    cache.store("k10", str(tmp_path / "out.pdf"), 10)
+    assert len(scans) == 1
+    assert len([name for name in os.listdir(cache.cache_dir) if name.endswith(".pdf")]) == 10
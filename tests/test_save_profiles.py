@@ -0,0 +1,54 @@
+import os
+
+import fitz
+import pytest
+
+from pdf_replacer_pymupdf import SAVE_PROFILES, PyMuPDFTextReplacer, ReplacementCancelled
+
+
+def _make_pdf(path, pages=3):
+    doc = fitz.open()
+    for _ in range(pages):
+        doc.new_page().insert_text((72, 100), "Old Company report")
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+@pytest.mark.parametrize("save_profile", list(SAVE_PROFILES))
+def test_save_profiles_replace(tmp_path, fonts_dir, save_profile):
+    input_pdf = _make_pdf(tmp_path / "in.pdf")
+    output_pdf = str(tmp_path / "out.pdf")
+    replacer = PyMuPDFTextReplacer({"Old Company": "New Company"}, fonts_dir=fonts_dir)
+    assert replacer.replace_pdf(input_pdf, output_pdf, save_profile=save_profile) == 3
+    with fitz.open(output_pdf) as doc:
+        texts = [page.get_text() for page in doc]
+    assert all("New Company" in text and "report" in text and "Old Company" not in text for text in texts)
+
+
+def test_incremental_copy_removed_on_error(tmp_path, fonts_dir, monkeypatch):
+    input_pdf = _make_pdf(tmp_path / "in.pdf")
+    output_pdf = str(tmp_path / "out.pdf")
+    replacer = PyMuPDFTextReplacer({"Old Company": "New Company"}, fonts_dir=fonts_dir)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(replacer, "_replace_doc", fail)
+    with pytest.raises(RuntimeError):
+        replacer.replace_pdf(input_pdf, output_pdf, save_profile="incremental")
+    assert not os.path.exists(output_pdf)
+
+
+def test_incremental_copy_removed_on_cancel(tmp_path, fonts_dir):
+    input_pdf = _make_pdf(tmp_path / "in.pdf")
+    output_pdf = str(tmp_path / "out.pdf")
+
+    class Cancelled:
+        def is_set(self):
+            return True
+
+    replacer = PyMuPDFTextReplacer({"Old Company": "New Company"}, fonts_dir=fonts_dir)
+    with pytest.raises(ReplacementCancelled):
+        replacer.replace_pdf(input_pdf, output_pdf, save_profile="incremental", cancel_event=Cancelled())
+    assert not os.path.exists(output_pdf)
@@ -0,0 +1,58 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import fitz
+import pytest
+
+from pdf_replacer_pymupdf import RuleSet
+from replacer_service import ReplacerService, _RequestHandler
+
+
+@pytest.fixture
+def service_url(fonts_dir):
+    service = ReplacerService({"default": RuleSet({"Old Company": "New Company"})}, fonts_dir=fonts_dir, workers=1)
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _RequestHandler)
+    httpd.daemon_threads = True
+    httpd.service = service
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+    service.shutdown()
+
+
+def _post(url, job):
+    request = urllib.request.Request(f"{url}/replace", data=json.dumps(job).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_invalid_jobs_are_rejected(tmp_path, service_url):
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 100), "Old Company")
+    input_pdf = str(tmp_path / "in.pdf")
+    doc.save(input_pdf)
+    doc.close()
+    output_pdf = str(tmp_path / "out.pdf")
+
+    for rules in (["Old Company"], 42, {"Old Company": 1}):
+        status, result = _post(service_url, {"input": input_pdf, "output": output_pdf, "rules": rules})
+        assert status == 400, rules
+    for output in (input_pdf, str(tmp_path / "sub" / ".." / "in.pdf")):
+        status, result = _post(service_url, {"input": input_pdf, "output": output})
+        assert status == 400
+        assert "相同" in result["error"]
+
+    status, result = _post(service_url, {"input": input_pdf, "output": output_pdf,
+                                         "rules": {"Old Company": "New Company"}})
+    assert (status, result["replacements"]) == (200, 1)
+    with fitz.open(output_pdf) as out:
+        assert out[0].get_text().strip() == "New Company"
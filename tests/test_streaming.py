@@ -0,0 +1,141 @@
+import os
+import signal
+import subprocess
+import sys
+
+import fitz
+import pytest
+
+from conftest import REPO_DIR
+from pdf_replacer_pymupdf import PyMuPDFTextReplacer, ReplacementCancelled
+
+
+def _make_pdf(path, pages=12):
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 100), f"Page {page_num + 1} of Old Company report")
+        if page_num:
+            page.insert_link({"kind": fitz.LINK_GOTO, "page": 0, "from": fitz.Rect(72, 200, 200, 220)})
+    doc.set_toc([[1, "Start", 1], [1, "End", pages]])
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+@pytest.mark.parametrize("save_profile", [None, "compact"])
+def test_stream_output_matches_regular_run(tmp_path, fonts_dir, save_profile):
+    input_pdf = _make_pdf(tmp_path / "in.pdf")
+    replacer = PyMuPDFTextReplacer({"Old Company": "New Company"}, fonts_dir=fonts_dir)
+    count = replacer.replace_pdf(input_pdf, str(tmp_path / "stream.pdf"), stream=True, window=5,
+                                 save_profile=save_profile)
+    assert count == replacer.replace_pdf(input_pdf, str(tmp_path / "regular.pdf")) == 12
+
+    with fitz.open(str(tmp_path / "stream.pdf")) as streamed, fitz.open(str(tmp_path / "regular.pdf")) as regular:
+        assert len(streamed) == len(regular) == 12
+        assert [page.get_text() for page in streamed] == [page.get_text() for page in regular]
+        assert streamed.get_toc() == regular.get_toc()
+        assert [len(page.get_links()) for page in streamed] == [len(page.get_links()) for page in regular]
+    # 临时文件放在输出目录中，完成后不应残留
+    assert sorted(os.listdir(tmp_path)) == ["in.pdf", "regular.pdf", "stream.pdf"]
+
+
+def test_stream_does_not_duplicate_shared_resources(tmp_path, fonts_dir, embedded_font):
+    doc = fitz.open()
+    for page_num in range(30):
+        page = doc.new_page()
+        page.insert_font(fontname="F1", fontfile=embedded_font)
+        page.insert_text((72, 100), f"Page {page_num + 1} of Old Company report", fontname="F1")
+    input_pdf = str(tmp_path / "in.pdf")
+    doc.save(input_pdf, garbage=4, deflate=True)
+    doc.close()
+
+    replacer = PyMuPDFTextReplacer({"Old Company": "New Company"}, fonts_dir=fonts_dir)
+    replacer.replace_pdf(input_pdf, str(tmp_path / "regular.pdf"), save_profile="incremental")
+    replacer.replace_pdf(input_pdf, str(tmp_path / "stream.pdf"), stream=True, window=7)
+
+    def font_xrefs(path):
+        with fitz.open(path) as out:
+            return {font[0] for page in out for font in page.get_fonts()}
+
+    assert font_xrefs(str(tmp_path / "stream.pdf")) == font_xrefs(str(tmp_path / "regular.pdf"))
+    # 原字体和替换时嵌入的字体各一份，不随窗口数增加
+    assert len(font_xrefs(str(tmp_path / "stream.pdf"))) == 2
+    regular_size = os.path.getsize(tmp_path / "regular.pdf")
+    assert os.path.getsize(tmp_path / "stream.pdf") <= regular_size * 1.1
+
+
+def test_checkpoint_resumes_after_interruption(tmp_path, fonts_dir):
+    input_pdf = _make_pdf(tmp_path / "in.pdf")
+    output_pdf = str(tmp_path / "out.pdf")
+    checkpoint_dir = str(tmp_path / "checkpoints")
+    replacer = PyMuPDFTextReplacer({"Old Company": "New Company"}, fonts_dir=fonts_dir)
+
+    class CancelAfter:
+        def __init__(self, pages):
+            self.pages = pages
+
+        def is_set(self):
+            self.pages -= 1
+            return self.pages < 0
+
+    with pytest.raises(ReplacementCancelled):
+        replacer.replace_pdf(input_pdf, output_pdf, window=4, checkpoint_dir=checkpoint_dir,
+                             cancel_event=CancelAfter(6))
+    assert len(os.listdir(checkpoint_dir)) == 2
+
+    count = replacer.replace_pdf(input_pdf, output_pdf, window=4, checkpoint_dir=checkpoint_dir)
+    assert count == 12
+    assert replacer.metrics.counters["resumed_pages"] == 4
+    assert os.listdir(checkpoint_dir) == []
+    with fitz.open(output_pdf) as doc:
+        assert all("New Company" in page.get_text() for page in doc)
+        assert len(doc.get_toc()) == 2
+
+
+def test_stream_with_workers_is_rejected(tmp_path, fonts_dir):
+    input_pdf = _make_pdf(tmp_path / "in.pdf", pages=2)
+    replacer = PyMuPDFTextReplacer({"Old Company": "New Company"}, fonts_dir=fonts_dir)
+    with pytest.raises(ValueError):
+        replacer.replace_pdf(input_pdf, str(tmp_path / "out.pdf"), stream=True, workers=2)
+
+    rules_file = tmp_path / "rules.txt"
+    rules_file.write_text("Old Company|New Company\n", encoding="utf-8")
+    result = subprocess.run([sys.executable, os.path.join(REPO_DIR, "pdf_replacer_pymupdf.py"), input_pdf,
+                             str(tmp_path / "out.pdf"), str(rules_file), "--stream", "--workers", "2"],
+                            capture_output=True, text=True)
+    assert result.returncode == 2
+    assert not os.path.exists(tmp_path / "out.pdf")
+
+
+def test_checkpoint_resumes_after_kill(tmp_path, fonts_dir):
+    input_pdf = _make_pdf(tmp_path / "in.pdf")
+    output_pdf = str(tmp_path / "out.pdf")
+    checkpoint_dir = str(tmp_path / "checkpoints")
+    # 子进程在第 7 页处理完后被杀死：第一个窗口已保存，第二个窗口只做了一半
+    script = (
+        "import os, signal, sys\n"
+        "from pdf_replacer_pymupdf import PyMuPDFTextReplacer\n"
+        "def kill(progress):\n"
+        "    if progress['page'] == 7:\n"
+        "        os.kill(os.getpid(), signal.SIGKILL)\n"
+        "PyMuPDFTextReplacer({'Old Company': 'New Company'}, fonts_dir=sys.argv[4]).replace_pdf(\n"
+        "    sys.argv[1], sys.argv[2], window=4, checkpoint_dir=sys.argv[3], progress_callback=kill)\n"
+    )
+    result = subprocess.run([sys.executable, "-c", script, input_pdf, output_pdf, checkpoint_dir, fonts_dir],
+                            cwd=REPO_DIR, capture_output=True, text=True)
+    assert result.returncode == -signal.SIGKILL
+    assert not os.path.exists(output_pdf)
+    partial = [name for name in os.listdir(checkpoint_dir) if name.endswith(".pdf")]
+    assert len(partial) == 1
+    # 模拟保存到一半时被杀死：检查点之后多出的字节在续跑时截掉
+    with open(os.path.join(checkpoint_dir, partial[0]), "ab") as f:
+        f.write(b"\n% torn write")
+
+    replacer = PyMuPDFTextReplacer({"Old Company": "New Company"}, fonts_dir=fonts_dir)
+    assert replacer.replace_pdf(input_pdf, output_pdf, window=4, checkpoint_dir=checkpoint_dir) == 12
+    assert replacer.metrics.counters["resumed_pages"] == 4
+    assert os.listdir(checkpoint_dir) == []
+    with fitz.open(output_pdf) as doc:
+        assert all("New Company" in page.get_text() and "Old Company" not in page.get_text() for page in doc)
+        assert len(doc.get_toc()) == 2
@@ -0,0 +1,96 @@
+import os
+
+import fitz
+import pytest
+
+from pdf_replacer_pymupdf import PdfTemplate
+
+
+def _make_template(path, fontfile=None):
+    doc = fitz.open()
+    page = doc.new_page()
+    fontname = "helv"
+    if fontfile:
+        page.insert_font(fontname="F1", fontfile=fontfile)
+        fontname = "F1"
+    page.insert_text((72, 100), "Dear {{NAME}}, your id is {{ID}}.", fontname=fontname)
+    page.insert_text((72, 130), "Name: identity check", fontname=fontname)
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+@pytest.mark.parametrize("save_profile", ["incremental", "fast", "compact"])
+def test_render_with_embedded_font(tmp_path, fonts_dir, embedded_font, save_profile):
+    template_pdf = _make_template(tmp_path / "template.pdf", fontfile=embedded_font)
+    template = PdfTemplate(template_pdf, ["{{NAME}}", "{{ID}}"], fonts_dir=fonts_dir)
+    assert template.placeholders == ["{{NAME}}", "{{ID}}"]
+
+    output_pdf = str(tmp_path / "out.pdf")
+    template.render({"{{NAME}}": "Alice", "{{ID}}": "A001"}, output_pdf, save_profile=save_profile)
+
+    with fitz.open(output_pdf) as doc:
+        text = doc[0].get_text()
+        fonts = {font[3] for font in doc[0].get_fonts()}
+    assert "Alice" in text and "A001" in text
+    assert "{{" not in text
+    assert "Name: identity check" in text
+    assert fonts == {"Liberation Sans Bold"}
+
+
+def test_render_bytes_with_builtin_font(tmp_path, fonts_dir):
+    template = PdfTemplate(_make_template(tmp_path / "template.pdf"), ["{{NAME}}", "{{ID}}"], fonts_dir=fonts_dir)
+    data = template.render_bytes({"{{NAME}}": "Bob", "{{ID}}": "B002"})
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        text = doc[0].get_text()
+    assert "Bob" in text and "B002" in text and "{{" not in text
+
+
+def test_render_requires_all_placeholders(tmp_path, fonts_dir):
+    template = PdfTemplate(_make_template(tmp_path / "template.pdf"), ["{{NAME}}", "{{ID}}", "{{MISSING}}"],
+                           fonts_dir=fonts_dir)
+    assert template.placeholders == ["{{NAME}}", "{{ID}}"]
+    with pytest.raises(ValueError):
+        template.render({"{{NAME}}": "Bob"}, str(tmp_path / "out.pdf"))
+
+
+def test_renderer_keeps_plain_columns_out_of_placeholders(tmp_path, monkeypatch, fonts_dir):
+    import template_renderer
+
+    assert template_renderer.is_placeholder("{{NAME}}")
+    assert template_renderer.is_placeholder("[ID]")
+    assert not template_renderer.is_placeholder("id")
+    assert not template_renderer.is_placeholder("name")
+
+    template_pdf = _make_template(tmp_path / "template.pdf")
+    values_file = tmp_path / "values.csv"
+    values_file.write_text("id,{{NAME}},{{ID}}\nc1,Alice,A001\nc2,Bob,B002\n", encoding="utf-8")
+    output_dir = tmp_path / "out"
+    monkeypatch.setattr("sys.argv", ["template_renderer.py", template_pdf, str(values_file),
+                                     "--output-dir", str(output_dir), "--name-field", "id", "--workers", "1",
+                                     "--report", str(tmp_path / "report.jsonl"), "--fonts-dir", fonts_dir])
+    template_renderer.main()
+
+    with fitz.open(str(output_dir / "c2.pdf")) as doc:
+        text = doc[0].get_text()
+    assert "Bob" in text and "B002" in text
+    assert "Name: identity check" in text
+
+
+def test_renderer_sanitizes_and_deduplicates_names(tmp_path, monkeypatch, fonts_dir):
+    import template_renderer
+
+    template_pdf = _make_template(tmp_path / "template.pdf")
+    values_file = tmp_path / "values.csv"
+    values_file.write_text("id,{{NAME}},{{ID}}\n../escaped,A,1\n/tmp/abs,B,2\nc1,C,3\nc1,D,4\n..,E,5\n",
+                           encoding="utf-8")
+    output_dir = tmp_path / "out"
+    monkeypatch.setattr("sys.argv", ["template_renderer.py", template_pdf, str(values_file),
+                                     "--output-dir", str(output_dir), "--name-field", "id", "--workers", "1",
+                                     "--report", str(tmp_path / "report.jsonl"), "--fonts-dir", fonts_dir])
+    template_renderer.main()
+
+    assert sorted(os.listdir(output_dir)) == ["abs.pdf", "c1.pdf", "c1_2.pdf", "escaped.pdf", "variant_000005.pdf"]
+    assert not os.path.exists(tmp_path / "escaped.pdf")
+    with fitz.open(str(output_dir / "c1_2.pdf")) as doc:
+        assert "D\n4" in doc[0].get_text()
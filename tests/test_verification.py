@@ -0,0 +1,36 @@
+import fitz
+
+from pdf_replacer_pymupdf import PyMuPDFTextReplacer, RuleSet, build_verification_report, verify_replacements
+
+
+def _make_pdf(path, text):
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 100), text)
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+def test_case_sensitive_rules_verified_with_same_options(tmp_path, fonts_dir):
+    input_pdf = _make_pdf(tmp_path / "in.pdf", "acme corp and Acme Corp")
+    output_pdf = str(tmp_path / "out.pdf")
+    ruleset = RuleSet({"acme corp": "ACME CORP"}, case_sensitive=True)
+    PyMuPDFTextReplacer(ruleset, fonts_dir=fonts_dir).replace_pdf(input_pdf, output_pdf)
+
+    report = build_verification_report(output_pdf, ruleset)
+    rule = report["rules"][0]
+    assert rule["status"] == "replaced"
+    assert (rule["old_count"], rule["new_count"]) == (0, 1)
+    assert verify_replacements(output_pdf, ruleset) == []
+
+
+def test_whole_word_rules_verified_with_same_options(tmp_path, fonts_dir):
+    input_pdf = _make_pdf(tmp_path / "in.pdf", "cat catalog")
+    output_pdf = str(tmp_path / "out.pdf")
+    ruleset = RuleSet({"cat": "dog"}, whole_word=True)
+    PyMuPDFTextReplacer(ruleset, fonts_dir=fonts_dir).replace_pdf(input_pdf, output_pdf)
+
+    rule = build_verification_report(output_pdf, ruleset)["rules"][0]
+    assert rule["status"] == "replaced"
+    # 普通字典仍按默认选项统计，"catalog" 中的 cat 算作残留
+    assert build_verification_report(output_pdf, ruleset.rules)["rules"][0]["status"] == "remaining"